@@ -20,6 +20,62 @@ def create_app():
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev")
     app.config["DEBUG"] = (os.getenv("DEBUG", "true").lower() == "true")
     app.config["ADMIN_RESET_CODE"] = os.getenv("ADMIN_RESET_CODE", "")
+    # Minimum interval between presence heartbeat writes for a user.
+    app.config["PRESENCE_HEARTBEAT_SECONDS"] = int(os.getenv("PRESENCE_HEARTBEAT_SECONDS", "60"))
+
+    # Per-user token bucket for /generate, and a global cap on concurrent upstream calls.
+    app.config["GENERATE_RATE_PER_MINUTE"] = float(os.getenv("GENERATE_RATE_PER_MINUTE", "4"))
+    app.config["GENERATE_BURST"] = int(os.getenv("GENERATE_BURST", "3"))
+    app.config["UPSTREAM_MAX_INFLIGHT"] = int(os.getenv("UPSTREAM_MAX_INFLIGHT", "8"))
+    app.config["UPSTREAM_LEASE_SECONDS"] = int(os.getenv("UPSTREAM_LEASE_SECONDS", "60"))
+    # Image providers in priority order. Requests still pending after the current provider's
+    # p95 latency (clamped to the min/max below) are hedged to the next provider.
+    app.config["IMAGE_PROVIDERS"] = [
+        name.strip() for name in os.getenv("IMAGE_PROVIDERS", "clipdrop,procedural").split(",") if name.strip()
+    ]
+    app.config["HEDGE_MIN_DELAY_SECONDS"] = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "2"))
+    app.config["HEDGE_MAX_DELAY_SECONDS"] = float(os.getenv("HEDGE_MAX_DELAY_SECONDS", "20"))
+    # Used until a provider has enough successful samples for a p95.
+    app.config["HEDGE_DEFAULT_DELAY_SECONDS"] = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "12"))
+    app.config["PROCEDURAL_IMAGE_SIZE"] = int(os.getenv("PROCEDURAL_IMAGE_SIZE", "512"))
+    # Processes used to hash passwords in bulk user imports (0 = one per CPU).
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+    # Connection pool size for the async image client (ASGI mode only).
+    app.config["ASYNC_UPSTREAM_POOL_SIZE"] = int(os.getenv("ASYNC_UPSTREAM_POOL_SIZE", "100"))
+    # Threads for the routes the async mode hands to the regular Flask app.
+    app.config["ASYNC_WSGI_THREADS"] = int(os.getenv("ASYNC_WSGI_THREADS", "32"))
+
+    # Live admin updates: idle interval between keepalive frames on /admin/stream.
+    app.config["ADMIN_STREAM_KEEPALIVE_SECONDS"] = int(os.getenv("ADMIN_STREAM_KEEPALIVE_SECONDS", "15"))
+    # Each open admin page holds one worker thread for as long as it stays open, so by
+    # default only half of a gthread worker's threads (GUNICORN_THREADS) may be streams.
+    app.config["ADMIN_STREAM_MAX_CLIENTS"] = int(os.getenv(
+        "ADMIN_STREAM_MAX_CLIENTS", str(max(1, int(os.getenv("GUNICORN_THREADS", "8")) // 2))
+    ))
+
+    # Response compression (gzip, or brotli when installed) and static asset caching.
+    app.config["COMPRESS_MIN_SIZE"] = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    app.config["COMPRESS_LEVEL"] = int(os.getenv("COMPRESS_LEVEL", "6"))
+    app.config["STATIC_MAX_AGE"] = int(os.getenv("STATIC_MAX_AGE", str(365 * 24 * 60 * 60)))
+
+    # Warm up at start-up (templates, caches, DB) before serving.
+    app.config["WARMUP"] = (os.getenv("WARMUP", "true").lower() == "true")
+    # How long a worker may serve settings from its in-memory cache before re-reading them.
+    app.config["SETTINGS_CACHE_SECONDS"] = int(os.getenv("SETTINGS_CACHE_SECONDS", "30"))
+
+    # Seconds a computed /admin/logs/analytics result is reused for the same query.
+    app.config["ANALYTICS_CACHE_SECONDS"] = int(os.getenv("ANALYTICS_CACHE_SECONDS", "30"))
+
+    # Shared state (user/settings caches, credentials, image cache, locks, pub/sub).
+    # "local" uses SQLite and files on this host; "redis" shares them between hosts.
+    app.config["STORAGE_BACKEND"] = os.getenv("STORAGE_BACKEND", "local").lower()
+    app.config["REDIS_URL"] = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    app.config["STORAGE_PREFIX"] = os.getenv("STORAGE_PREFIX", "moodart:")
+    # How often each worker polls for invalidation messages (local backend only).
+    app.config["PUBSUB_POLL_SECONDS"] = float(os.getenv("PUBSUB_POLL_SECONDS", "1"))
+    # Off by default: the cache key is the emotion and prompt, so an empty
+    # prompt would get the same image for every user.
+    app.config["IMAGE_CACHE"] = (os.getenv("IMAGE_CACHE", "false").lower() == "true")
 
     # Configure data directory and database path.
     data_dir = project_root / "data"
@@ -30,6 +86,13 @@ def create_app():
     # Ensure the instance folder exists for any fallback configurations.
     os.makedirs(app.instance_path, exist_ok=True)
 
+    # Columnar copy of feedback/logs for the admin reports (one per database file),
+    # brought up to date at most this often when a report is requested.
+    app.config["SNAPSHOT_DIR"] = os.getenv(
+        "SNAPSHOT_DIR", os.path.join(app.instance_path, "snapshot", Path(app.config["DB_FILE"]).stem)
+    )
+    app.config["SNAPSHOT_REFRESH_SECONDS"] = int(os.getenv("SNAPSHOT_REFRESH_SECONDS", "60"))
+
     # Configure session cookies for security.
     app.config.update(
         SESSION_COOKIE_HTTPONLY=True,
@@ -37,8 +100,53 @@ def create_app():
         # SESSION_COOKIE_SECURE=True  # Enable if serving over HTTPS
     )
 
+    # Bring the database schema up to date (new columns, backfills, indexes).
+    from .migrations import migrate
+    from .utils import get_db
+    with app.app_context():
+        conn = get_db()
+        migrate(conn)
+        conn.close()
+
+    # Shared-state backend; must exist before anything reads users or settings.
+    from . import storage
+    storage.init_app(app)
+
+    # One-off data fixes. Some check the users file first, so they run once storage is up.
+    # One that refuses to run is retried at the next start; the app still starts meanwhile.
+    from .migrations import MigrationError, migrate_data
+    from .models.user import stored_usernames
+    with app.app_context():
+        conn = get_db()
+        try:
+            migrate_data(conn, stored_usernames())
+        except MigrationError as e:
+            app.logger.error(f"Data migration not applied: {e}")
+        finally:
+            conn.close()
+
+    from . import events
+    events.broadcaster.max_subscribers = app.config["ADMIN_STREAM_MAX_CLIENTS"]
+
     # Register blueprints to organize routes.
     from .routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    # `flask users ...` commands for bulk user administration, `flask storage ...` for the backend,
+    # `flask reports ...` for the analytics snapshot.
+    from .cli import users_cli, storage_cli, reports_cli
+    app.cli.add_command(users_cli)
+    app.cli.add_command(storage_cli)
+    app.cli.add_command(reports_cli)
+
+    # Compression, ETags and fingerprinted static URLs.
+    from . import http_cache
+    http_cache.init_app(app)
+
+    # Compile templates, fill caches and prime the DB before the first request.
+    from . import warmup
+    warmup.init_bytecode_cache(app)
+    if app.config["WARMUP"]:
+        warmup.warm_up(app)
+
     return app
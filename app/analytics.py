@@ -0,0 +1,183 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from .utils import get_db, now_ms
+
+# Time-bucketed event counts over the logs table, for the charts on the Logs
+# page. Counting happens in SQL over the ts_ms index, so the cost depends on
+# the number of buckets returned rather than on how many rows are shipped to
+# the browser.
+
+GRANULARITIES = {
+    "minute": 60 * 1000,
+    "hour": 60 * 60 * 1000,
+    "day": 24 * 60 * 60 * 1000,
+}
+MINUTE, HOUR, DAY = GRANULARITIES["minute"], GRANULARITIES["hour"], GRANULARITIES["day"]
+# Bucket widths used when a range has more buckets than requested points, so
+# merged buckets still line up with the clock (e.g. 6 hours, not 41).
+NICE_STEPS = (
+    MINUTE, 2 * MINUTE, 5 * MINUTE, 10 * MINUTE, 15 * MINUTE, 30 * MINUTE,
+    HOUR, 2 * HOUR, 3 * HOUR, 6 * HOUR, 12 * HOUR,
+    DAY, 2 * DAY, 7 * DAY, 14 * DAY, 30 * DAY,
+)
+# Whitelisted group-by columns (interpolated into SQL, so never taken from the request).
+GROUP_COLUMNS = {"event": "event", "user": "user", "source": "source"}
+OTHER_GROUP = "(other)"
+# Real UTC offsets run from -12:00 to +14:00; client-supplied offsets are clamped to +-14:00.
+MAX_TZ_OFFSET_MINUTES = 14 * 60
+
+
+def local_offset_minutes() -> int:
+    """The server's current UTC offset in minutes, used when the client doesn't send one."""
+    return int(datetime.now().astimezone().utcoffset().total_seconds() // 60)
+
+
+def _bucket_step(span_ms: int, granularity: str, points: int) -> int:
+    """Bucket width for the range: the granularity, widened until the range fits in `points` buckets."""
+    needed = max(GRANULARITIES[granularity], math.ceil(span_ms / max(1, points)))
+    nice = next((step for step in NICE_STEPS if step >= needed), None)
+    return nice or math.ceil(needed / (30 * DAY)) * 30 * DAY
+
+
+def _floor_local(ms: int, width: int, offset_ms: int) -> int:
+    return ((ms + offset_ms) // width) * width - offset_ms
+
+
+def _filter_clause(filters: dict) -> tuple[str, list]:
+    """LIKE filters on event/user/source, matching the Logs page table."""
+    clause, params = "", []
+    for column in ("event", "user", "source"):
+        value = filters.get(column)
+        if value:
+            clause += f" AND {column} LIKE ?"
+            params.append(f"%{value}%")
+    return clause, params
+
+
+def bucket_counts(start_ms: int | None, end_ms: int | None, granularity: str = "day", group_by: str = "event",
+                  points: int = 200, top: int = 8, tz_offset_minutes: int | None = None,
+                  filters: dict | None = None) -> dict:
+    """
+    Counts log events per time bucket, split by `group_by`.
+
+    Buckets are aligned to the client's local midnight/hour via
+    `tz_offset_minutes`. A range with more than `points` buckets at the
+    requested granularity is downsampled by widening the buckets, so counts
+    still add up. Groups beyond the `top` busiest are merged into "(other)".
+    """
+    filters = filters or {}
+    column = GROUP_COLUMNS[group_by]
+    offset_ms = (local_offset_minutes() if tz_offset_minutes is None else tz_offset_minutes) * 60 * 1000
+    where, params = _filter_clause(filters)
+
+    db = get_db()
+    try:
+        if start_ms is None:
+            row = db.execute(f"SELECT MIN(ts_ms) FROM logs WHERE 1=1{where}", params).fetchone()
+            start_ms = row[0] if row[0] is not None else now_ms()
+        if end_ms is None:
+            end_ms = now_ms()
+        end_ms = max(start_ms, end_ms)
+
+        step = _bucket_step(end_ms - start_ms + 1, granularity, points)
+        # Buckets of an hour or more start at local midnight, shorter ones on the hour.
+        origin = _floor_local(start_ms, DAY if step >= HOUR else HOUR, offset_ms)
+        origin += ((start_ms - origin) // step) * step
+
+        rows = db.execute(
+            f"""
+            SELECT ? + ((ts_ms - ?) / ?) * ? AS bucket,
+                   COALESCE(NULLIF({column}, ''), '(none)') AS grp,
+                   COUNT(*) AS n
+            FROM logs
+            WHERE ts_ms BETWEEN ? AND ?{where}
+            GROUP BY bucket, grp
+            """,
+            [origin, origin, step, step, start_ms, end_ms, *params],
+        ).fetchall()
+    finally:
+        db.close()
+
+    buckets = list(range(origin, end_ms + 1, step))
+    index = {b: i for i, b in enumerate(buckets)}
+
+    totals: dict[str, int] = {}
+    for row in rows:
+        totals[row["grp"]] = totals.get(row["grp"], 0) + row["n"]
+    ranked = sorted(totals, key=lambda g: (-totals[g], g))
+    kept = set(ranked[:top])
+
+    series: dict[str, list[int]] = {g: [0] * len(buckets) for g in ranked[:top]}
+    if len(ranked) > top:
+        series[OTHER_GROUP] = [0] * len(buckets)
+    for row in rows:
+        group = row["grp"] if row["grp"] in kept else OTHER_GROUP
+        series[group][index[row["bucket"]]] += row["n"]
+
+    return {
+        "granularity": granularity,
+        "group_by": group_by,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "bucket_ms": step,
+        "downsampled": step != GRANULARITIES[granularity],
+        "buckets": buckets,
+        "series": [{"key": g, "counts": counts, "total": sum(counts)} for g, counts in series.items()],
+        "totals": {g: totals[g] for g in ranked},
+        "total": sum(totals.values()),
+    }
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, max_entries: int = 128, ttl: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def cached_bucket_counts(**kwargs) -> dict:
+    """
+    bucket_counts, memoised per set of arguments for ANALYTICS_CACHE_SECONDS.
+    An open end (now) is rounded up to the minute so repeated requests share
+    an entry.
+    """
+    cache = current_app.extensions.get("analytics_cache")
+    if cache is None:
+        cache = TTLCache(ttl=current_app.config["ANALYTICS_CACHE_SECONDS"])
+        current_app.extensions["analytics_cache"] = cache
+
+    if kwargs.get("end_ms") is None:
+        minute = GRANULARITIES["minute"]
+        kwargs["end_ms"] = -(-now_ms() // minute) * minute
+    key = tuple(sorted((k, tuple(sorted(v.items())) if isinstance(v, dict) else v) for k, v in kwargs.items()))
+    result = cache.get(key)
+    if result is None:
+        result = bucket_counts(**kwargs)
+        cache.set(key, result)
+    return result
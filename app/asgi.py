@@ -0,0 +1,274 @@
+import asyncio
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import session, redirect, url_for, flash, Response
+from werkzeug.test import EnvironBuilder
+
+from . import create_app, events, presence, ratelimit, routes
+from .async_client import build_image_url_async, close_session
+from .logger import log_event
+from .utils import admin_required
+
+# Optional async serving mode. Run with an ASGI server, e.g.:
+#     uvicorn asgi:app
+# /generate and /feedback are served on the event loop, so a single process
+# can hold many generations open while they wait on the image service, and so
+# is /admin/stream, so open admin pages don't each hold a thread. Every other
+# route is handed to the regular Flask (WSGI) app on a thread pool.
+# Requires the optional `asgiref` and `aiohttp` packages (requirements-async.txt).
+
+# How often an open /admin/stream checks its subscription for new events.
+STREAM_POLL_SECONDS = 0.25
+# Default limit on open admin pages per process (ADMIN_STREAM_MAX_CLIENTS overrides it).
+ASYNC_STREAM_MAX_CLIENTS = 64
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    """
+    asgiref runs WSGI apps "thread-sensitively", i.e. all on one shared
+    thread, so every passthrough request would wait for the one before it.
+    This runs each request on its own thread from a pool instead.
+    """
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        run = sync_to_async(
+            WsgiToAsgiInstance.__dict__["run_wsgi_app"].func, thread_sensitive=False, executor=self.executor
+        )
+        await run(self, body)
+
+
+class _PooledWsgiToAsgi(WsgiToAsgi):
+    def __init__(self, wsgi_application, max_threads: int):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+
+class AsyncApp:
+    """ASGI application wrapping the Flask app with async generation and feedback views."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_app = _PooledWsgiToAsgi(flask_app, flask_app.config["ASYNC_WSGI_THREADS"])
+        self.views = {
+            ("POST", "/generate"): self.generate,
+            ("POST", "/feedback"): self.feedback,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        if scope["type"] == "http" and (scope.get("method"), scope.get("path")) == ("GET", "/admin/stream"):
+            await self.admin_stream(scope, receive, send)
+            return
+
+        view = self.views.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if view is None:
+            await self.wsgi_app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        with self.flask_app.request_context(_build_environ(scope, body)):
+            response = await self._dispatch(view)
+        await _send_response(response, send)
+
+    async def _dispatch(self, view):
+        """Runs a view with the app's before/after request hooks, like Flask's full_dispatch_request."""
+        app = self.flask_app
+        try:
+            try:
+                rv = await asyncio.to_thread(app.preprocess_request)
+                if rv is None:
+                    rv = await view()
+            except Exception as e:
+                # HTTP errors and registered error handlers; anything else is re-raised.
+                rv = app.handle_user_exception(e)
+            return await asyncio.to_thread(app.process_response, app.make_response(rv))
+        except Exception as e:
+            return app.make_response(app.handle_exception(e))
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                with self.flask_app.app_context():
+                    await close_session()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def generate(self):
+        """Async version of routes.generate: the upstream call is awaited instead of blocking a thread."""
+        if "username" not in session:
+            flash("Please log in to access this page.", "warning")
+            return redirect(url_for("main.entry"))
+
+        emotion, prompt = routes._generate_form()
+        username = session.get("username")
+
+        # Quota and slot bookkeeping are short storage round trips; keep them off the event loop.
+        rejection = await asyncio.to_thread(routes._admit_generation, emotion, username)
+        if rejection is not None:
+            return rejection
+
+        config = self.flask_app.config
+        lease = await asyncio.to_thread(
+            ratelimit.acquire_slot, config["UPSTREAM_MAX_INFLIGHT"], config["UPSTREAM_LEASE_SECONDS"]
+        )
+        if lease is None:
+            return await asyncio.to_thread(routes._upstream_busy, username)
+
+        try:
+            await asyncio.to_thread(
+                log_event, "generate", user=username, data={"emotion": emotion, "prompt": prompt}
+            )
+            image_url = await build_image_url_async(prompt, emotion)
+        finally:
+            await asyncio.to_thread(ratelimit.release_slot, lease)
+
+        return routes._render_result(prompt, emotion, image_url)
+
+    async def feedback(self):
+        """Feedback is a short database write: run the regular view in a worker thread."""
+        return await asyncio.to_thread(routes.feedback)
+
+    async def admin_stream(self, scope, receive, send):
+        """Async version of routes.admin_stream: open pages wait on the event loop, not on a thread each."""
+        body = await _read_body(receive)
+        with self.flask_app.request_context(_build_environ(scope, body)):
+            subscription = None
+
+            async def open_stream():
+                nonlocal subscription
+                denied = admin_required(lambda: None)()
+                if denied is not None:
+                    return denied
+                subscription = events.broadcaster.subscribe()
+                if subscription is None:
+                    return Response("Too many live admin connections.", status=503, headers={"Retry-After": "30"})
+                # Streamed (empty) body, so the after-request hooks leave it alone; events are sent below.
+                return Response(iter(()), mimetype="text/event-stream",
+                                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+            response = await self._dispatch(open_stream)
+            if subscription is None or response.status_code != 200:
+                if subscription is not None:
+                    events.broadcaster.unsubscribe(subscription)
+                await _send_response(response, send)
+                return
+            try:
+                await send({"type": "http.response.start", "status": 200, "headers": _header_list(response)})
+                await self._send_events(subscription, receive, send)
+            finally:
+                events.broadcaster.unsubscribe(subscription)
+
+    async def _send_events(self, subscription, receive, send):
+        """Forwards events as SSE frames until the client disconnects, like routes.admin_stream."""
+        keepalive = self.flask_app.config["ADMIN_STREAM_KEEPALIVE_SECONDS"]
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        async def frame(text):
+            await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+        async def presence_frame():
+            count = await asyncio.to_thread(presence.online_count, minutes=30)
+            await frame(events.format_sse("presence", {"active_sessions": count}))
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await frame("retry: 5000\n\n")
+            await presence_frame()
+            idle = 0.0
+            marked_at = None
+            while not disconnected.is_set():
+                if marked_at is None or time.monotonic() - marked_at >= keepalive:
+                    marked_at = time.monotonic()
+                    await asyncio.to_thread(events.mark_listening, keepalive)
+                try:
+                    event_type, payload = subscription.get_nowait()
+                except queue.Empty:
+                    try:
+                        await asyncio.wait_for(disconnected.wait(), STREAM_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        idle += STREAM_POLL_SECONDS
+                    if idle >= keepalive:
+                        idle = 0.0
+                        await presence_frame()
+                    continue
+                idle = 0.0
+                await frame(events.format_sse(event_type, payload))
+        except OSError:
+            pass  # client went away mid-write
+        finally:
+            watcher.cancel()
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _build_environ(scope, body: bytes) -> dict:
+    """Builds a WSGI environ for the request so Flask's request, session and url_for work as usual."""
+    headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]]
+    host = next((value for name, value in headers if name.lower() == "host"), None)
+    if host is None and scope.get("server"):
+        host = "%s:%s" % tuple(scope["server"])
+    client = scope.get("client")
+    builder = EnvironBuilder(
+        path=scope["path"],
+        base_url=f"{scope.get('scheme', 'http')}://{host or 'localhost'}{scope.get('root_path', '')}",
+        query_string=scope.get("query_string", b"").decode("latin-1"),
+        method=scope["method"],
+        headers=headers,
+        data=body,
+        environ_overrides={"REMOTE_ADDR": client[0] if client else ""},
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+def _header_list(response) -> list:
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()]
+
+
+async def _send_response(response, send) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": response.status_code,
+        "headers": _header_list(response),
+    })
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+def create_asgi_app():
+    """Creates the Flask app and wraps it for an ASGI server."""
+    flask_app = create_app()
+    if "ADMIN_STREAM_MAX_CLIENTS" not in os.environ:
+        # Streams don't hold threads here, so the thread-based default is needlessly low.
+        events.broadcaster.max_subscribers = ASYNC_STREAM_MAX_CLIENTS
+    return AsyncApp(flask_app)
@@ -0,0 +1,65 @@
+import asyncio
+import aiohttp
+from flask import current_app
+from . import image_generator
+from .image_providers import get_router
+from .image_generator import build_full_prompt, to_data_url, PLACEHOLDER_URL
+
+# Non-blocking ClipDrop client for the async serving mode (app/asgi.py).
+# Requires the optional `aiohttp` package (requirements-async.txt).
+
+# One pooled session per process, created lazily on the server's event loop.
+_SESSION: aiohttp.ClientSession | None = None
+
+
+def _get_session() -> aiohttp.ClientSession:
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(limit=current_app.config["ASYNC_UPSTREAM_POOL_SIZE"])
+        timeout = aiohttp.ClientTimeout(total=image_generator.CLIPDROP_TIMEOUT)
+        _SESSION = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _SESSION
+
+
+async def close_session() -> None:
+    """Closes the shared connection pool (called on server shutdown)."""
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+
+async def request_clipdrop_async(prompt: str, emotion: str) -> str | None:
+    """
+    Async counterpart of image_generator.request_clipdrop: generates an image
+    with ClipDrop and returns a Base64 Data URL, or None on failure.
+    """
+    api_key = image_generator.CLIPDROP_API_KEY
+    if not api_key:
+        current_app.logger.error("ClipDrop API key not set. Cannot generate image.")
+        return None
+
+    full_prompt = build_full_prompt(prompt, emotion)
+    # Giving the field a content type makes aiohttp send multipart/form-data, as ClipDrop expects.
+    form = aiohttp.FormData()
+    form.add_field("prompt", full_prompt, content_type="text/plain")
+
+    try:
+        current_app.logger.info(f"Generating image with ClipDrop prompt: {full_prompt}")
+        async with _get_session().post(
+            image_generator.CLIPDROP_API_URL, headers={"x-api-key": api_key}, data=form
+        ) as response:
+            if response.ok:
+                return to_data_url(await response.read())
+            error_message = await response.text()
+            current_app.logger.error(f"ClipDrop API Error: {response.status} - {error_message}")
+            return None
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        current_app.logger.error(f"A network error occurred with the ClipDrop API: {e}")
+        return None
+
+
+async def build_image_url_async(prompt: str, emotion: str) -> str:
+    """Async counterpart of image_generator.build_image_url."""
+    return await get_router().agenerate(prompt, emotion) or PLACEHOLDER_URL
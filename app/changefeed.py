@@ -0,0 +1,88 @@
+import base64
+import binascii
+import json
+from typing import Iterator
+
+# Incremental change feed over the logs and feedback tables, for ETL jobs
+# that only want what changed since their last pull. Both tables use
+# AUTOINCREMENT ids, and SQLite serialises writers, so a row never becomes
+# visible with an id below one a reader has already seen: "id > last seen"
+# is a complete and cheap (primary key range) way to find new rows.
+# Deletions are recorded in the tombstones table by models.user.purge_user_rows
+# and are fed the same way.
+
+TABLES = ("logs", "feedback")
+STREAMS = TABLES + ("tombstones",)
+CURSOR_VERSION = 1
+FETCH_BATCH = 500
+
+
+def encode_cursor(positions: dict[str, int]) -> str:
+    """Packs the last id seen in each stream into an opaque, URL-safe token."""
+    body = json.dumps({"v": CURSOR_VERSION, **{s: int(positions.get(s, 0)) for s in STREAMS}}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str | None) -> dict[str, int]:
+    """Unpacks a cursor from encode_cursor; an empty token starts from the beginning. Raises ValueError."""
+    if not token:
+        return {s: 0 for s in STREAMS}
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        body = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("malformed cursor") from None
+    if not isinstance(body, dict) or body.get("v") != CURSOR_VERSION:
+        raise ValueError("unsupported cursor version")
+    positions = {}
+    for stream in STREAMS:
+        value = body.get(stream, 0)
+        if not isinstance(value, int) or value < 0:
+            raise ValueError("malformed cursor")
+        positions[stream] = value
+    return positions
+
+
+def _rows_after(db, table: str, after_id: int, limit: int) -> Iterator[dict]:
+    """Rows with id > after_id in id order, fetched in batches so large pulls stream."""
+    cursor = db.execute(f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))
+    while True:
+        batch = cursor.fetchmany(FETCH_BATCH)
+        if not batch:
+            return
+        for row in batch:
+            yield dict(row)
+
+
+def iter_changes(db, positions: dict[str, int], limit: int) -> Iterator[dict]:
+    """
+    Yields change records after `positions`, at most `limit` per stream:
+      {"table": "logs"|"feedback", "op": "upsert", "id": ..., "row": {...}}
+      {"table": "logs"|"feedback", "op": "delete", "id": ..., "deleted_ms": ...}
+    and finally {"cursor": <token>, "more": <bool>}. Pass the cursor back to
+    continue; `more` is true when a stream hit the limit and should be pulled
+    again straight away.
+
+    Inserts are sent before deletes, so a delete never comes before the
+    upsert of its row. A row added and removed between two pulls is already
+    gone from its table and arrives only as a delete, of an id the reader
+    hasn't seen.
+    """
+    positions = dict(positions)
+    more = False
+    for table in TABLES:
+        sent = 0
+        for row in _rows_after(db, table, positions[table], limit):
+            positions[table] = row["id"]
+            sent += 1
+            yield {"table": table, "op": "upsert", "id": row["id"], "row": row}
+        more = more or sent == limit
+
+    sent = 0
+    for tomb in _rows_after(db, "tombstones", positions["tombstones"], limit):
+        positions["tombstones"] = tomb["id"]
+        sent += 1
+        yield {"table": tomb["table_name"], "op": "delete", "id": tomb["row_id"], "deleted_ms": tomb["ts_ms"]}
+    more = more or sent == limit
+
+    yield {"cursor": encode_cursor(positions), "more": more}
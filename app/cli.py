@@ -0,0 +1,102 @@
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from . import presence, snapshot
+from .logger import log_event
+from .models.user import (
+    bulk_create_users, bulk_delete_users, read_users_csv, read_usernames_csv, ADMIN_PWD_HASH_FILE, USERS_FILE_ENV
+)
+from .storage import CREDENTIALS, LocalBackend, create_backend, get_storage
+from .utils import get_db
+
+# Bulk user administration from the command line, e.g.:
+#     flask --app run users import cohort.csv
+#     flask --app run users delete --file leavers.csv
+users_cli = AppGroup("users", help="Bulk user administration.")
+
+
+@users_cli.command("import")
+@click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--overwrite", is_flag=True, help="Replace the password of users who already exist.")
+@click.option("--workers", type=int, default=None, help="Processes used for password hashing (default: one per CPU).")
+def import_users(csv_file, overwrite, workers):
+    """Create users from a CSV file of username,password rows."""
+    result = bulk_create_users(
+        read_users_csv(csv_file.read()),
+        overwrite=overwrite,
+        workers=workers or current_app.config["PASSWORD_HASH_WORKERS"] or None,
+    )
+    log_event("users_imported", source="cli", data={
+        "created": len(result["created"]),
+        "updated": len(result["updated"]),
+        "skipped": len(result["skipped"]),
+    })
+    for name, reason in result["skipped"]:
+        click.echo(f"Skipped {name or '(blank)'}: {reason}", err=True)
+    click.echo(f"{len(result['created'])} created, {len(result['updated'])} updated, {len(result['skipped'])} skipped.")
+
+
+@users_cli.command("delete")
+@click.argument("usernames", nargs=-1)
+@click.option("--file", "csv_file", type=click.File("r", encoding="utf-8-sig"),
+              help="CSV file with usernames in the first column.")
+@click.confirmation_option(prompt="Delete these users and all their data?")
+def delete_users(usernames, csv_file):
+    """Delete users and all their feedback, logs and presence data."""
+    targets = list(usernames)
+    if csv_file is not None:
+        targets += read_usernames_csv(csv_file.read())
+
+    deleted = bulk_delete_users(targets, get_db())
+    if deleted is None:
+        raise click.ClickException("Database purge failed; no data was changed.")
+    presence.forget(deleted)
+    if deleted:
+        log_event("users_deleted", source="cli", data={"deleted_users": deleted})
+    click.echo(f"Deleted {len(deleted)} user(s).")
+
+
+storage_cli = AppGroup("storage", help="Shared-state storage backend.")
+
+
+@storage_cli.command("copy-from-local")
+def copy_from_local():
+    """Copy credentials, settings and cached images from this host into the configured backend."""
+    target = get_storage()
+    if isinstance(target, LocalBackend):
+        raise click.ClickException("STORAGE_BACKEND is already 'local'; nothing to copy.")
+    source = create_backend(current_app, "local")
+
+    for key, value in source.kv_scan("").items():
+        target.kv_set(key, value)
+
+    copied = 0
+    for bucket, root in source.blob_dirs.items():
+        if bucket == CREDENTIALS:
+            names = [ADMIN_PWD_HASH_FILE, "data/users.json", USERS_FILE_ENV]
+        else:
+            names = os.listdir(root) if os.path.isdir(root) else []
+        for name in names:
+            data = source.blob_get(bucket, name)
+            if data is not None:
+                target.blob_put(bucket, name, data)
+                copied += 1
+
+    target.publish("users")
+    target.publish("settings")
+    click.echo(f"Copied {copied} file(s) and all settings to the '{target.name}' backend.")
+
+
+reports_cli = AppGroup("reports", help="Admin report snapshot.")
+
+
+@reports_cli.command("refresh")
+@click.option("--full", is_flag=True, help="Rebuild the snapshot from scratch instead of applying new changes.")
+def refresh_snapshot(full):
+    """Bring the columnar report snapshot up to date (e.g. from cron, ahead of admins opening the reports)."""
+    meta = snapshot.refresh(full=full)
+    rows = ", ".join(f"{count} {table}" for table, count in meta["rows"].items())
+    click.echo(f"Snapshot generation {meta['generation']}: {rows} row(s).")
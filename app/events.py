@@ -0,0 +1,130 @@
+import json
+import queue
+import threading
+import time
+from flask import current_app, has_app_context
+
+# Live updates for the admin pages. The write paths (log_event, feedback)
+# publish small events here; every connected admin page holds a subscription
+# and receives them over server-sent events.
+
+# While any process has an admin page connected, it keeps this key alive in the
+# store. Events are only relayed through the store (a write per event with the
+# local backend) while the key exists; otherwise they stay in this process.
+LISTENING_KEY = "events:listening"
+# How long a process trusts its last look at LISTENING_KEY.
+LISTENING_CHECK_SECONDS = 1.0
+
+
+class Broadcaster:
+    """
+    In-process fan-out with a bounded number of subscribers, each owning a
+    bounded queue. A subscriber that falls behind has its backlog dropped and
+    is told to resync, so one slow client can never hold up the write path.
+    """
+
+    def __init__(self, max_subscribers: int = 32, queue_size: int = 256):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._subscribers: set[queue.Queue] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue | None:
+        """Returns a new subscription queue, or None when the subscriber limit is reached."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            q = queue.Queue(maxsize=self.queue_size)
+            self._subscribers.add(q)
+            return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event_type: str, payload: dict) -> None:
+        """Queues an event for every subscriber without ever blocking."""
+        message = (event_type, payload)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                _drain(q)
+                try:
+                    q.put_nowait(("resync", {}))
+                except queue.Full:
+                    pass
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _drain(q: queue.Queue) -> None:
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+
+
+def format_sse(event_type: str, payload: dict) -> str:
+    """Formats one server-sent event frame."""
+    return f"event: {event_type}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+broadcaster = Broadcaster()
+
+# Per-process state for the listening key: when it was last written, and the last look at it.
+_marked = {"storage": None, "at": 0.0}
+_checked = {"storage": None, "at": 0.0, "listening": False}
+
+
+def mark_listening(keepalive: float) -> None:
+    """
+    Called by open admin streams on every event and keepalive (at least every
+    `keepalive` seconds): keeps LISTENING_KEY alive for a few intervals, so
+    every process relays its events. Writes at most once per interval.
+    """
+    storage = current_app.extensions.get("storage")
+    now = time.monotonic()
+    if storage is None or (_marked["storage"] is storage and now - _marked["at"] < keepalive):
+        return
+    try:
+        storage.kv_set(LISTENING_KEY, "1", ttl=3 * keepalive)
+    except Exception as e:
+        current_app.logger.error(f"Could not mark the admin stream as listening: {e}")
+        return
+    _marked.update(storage=storage, at=now)
+    # This process's own events must be relayed from now on, without waiting for the next look.
+    _checked.update(storage=storage, at=now, listening=True)
+
+
+def _anyone_listening(storage) -> bool:
+    now = time.monotonic()
+    if _checked["storage"] is not storage or now - _checked["at"] >= LISTENING_CHECK_SECONDS:
+        try:
+            listening = storage.kv_get(LISTENING_KEY) is not None
+        except Exception as e:
+            current_app.logger.error(f"Could not check for admin stream listeners: {e}")
+            listening = False
+        _checked.update(storage=storage, at=now, listening=listening)
+    return _checked["listening"]
+
+
+def publish(event_type: str, payload: dict) -> None:
+    """Publishes an event to all connected admin clients, in every worker process."""
+    storage = current_app.extensions.get("storage") if has_app_context() else None
+    if storage is not None and _anyone_listening(storage):
+        # Delivered here at once and relayed through the store to the other processes.
+        storage.publish("events", {"type": event_type, "payload": payload})
+    else:
+        broadcaster.publish(event_type, payload)
+
+
+def deliver(message: dict) -> None:
+    """Storage "events" channel handler: hands a relayed event to this process's subscribers."""
+    if "type" in message:
+        broadcaster.publish(message["type"], message["payload"])
@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import os
+import threading
+from flask import request
+from werkzeug.security import safe_join
+
+try:
+    import brotli  # Optional: used when installed and the client accepts "br".
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript",
+    "application/javascript", "application/json", "image/svg+xml",
+}
+
+# {static file path: (mtime, content hash)}
+_STATIC_HASHES: dict[str, tuple[float, str]] = {}
+# {(static filename, content hash, encoding): compressed bytes}
+_STATIC_COMPRESSED: dict[tuple[str, str, str], bytes] = {}
+_LOCK = threading.Lock()
+
+
+def static_version(static_folder: str, filename: str) -> str | None:
+    """
+    Short content hash of a static file, recomputed only when its mtime
+    changes. None if the name doesn't resolve to a regular file inside the
+    static folder.
+    """
+    path = safe_join(static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _LOCK:
+        cached = _STATIC_HASHES.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    with _LOCK:
+        _STATIC_HASHES[path] = (mtime, digest)
+    return digest
+
+
+def _choose_encoding() -> str | None:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compress_response(response, min_size: int, level: int, static_key: tuple | None):
+    if response.status_code != 200 or "Content-Encoding" in response.headers:
+        return response
+    if response.is_streamed and not response.direct_passthrough:
+        return response
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.direct_passthrough:
+        # Static files are sent straight from disk; only compress the fingerprinted ones we can cache.
+        if static_key is None:
+            return response
+        cache_key = static_key + (encoding,)
+        with _LOCK:
+            body = _STATIC_COMPRESSED.get(cache_key)
+        if body is None:
+            response.direct_passthrough = False
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            body = _compress(data, encoding, level)
+            with _LOCK:
+                _STATIC_COMPRESSED[cache_key] = body
+        else:
+            # Already compressed: release the open file instead of reading it.
+            response.close()
+            response.direct_passthrough = False
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        body = _compress(data, encoding, level)
+
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_app(app) -> None:
+    """
+    Registers response optimizations:
+      * content-hashed `?v=` query strings on url_for('static', ...) with
+        far-future, immutable Cache-Control on those URLs;
+      * weak ETags and 304 handling on admin pages and JSON responses;
+      * gzip (or brotli, when installed) compression above a size threshold.
+    """
+    static_folder = app.static_folder
+
+    @app.url_defaults
+    def add_static_version(endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            version = static_version(static_folder, values["filename"])
+            if version:
+                values["v"] = version
+
+    @app.after_request
+    def optimize_response(response):
+        config = app.config
+        static_key = None
+
+        if request.endpoint == "static":
+            if response.status_code not in (200, 304):
+                # Not served (e.g. a missing or out-of-folder path): never touch the file system for it.
+                return response
+            version = request.args.get("v")
+            filename = (request.view_args or {}).get("filename")
+            if version and filename and version == static_version(static_folder, filename):
+                response.cache_control.public = True
+                response.cache_control.no_cache = None
+                response.cache_control.max_age = config["STATIC_MAX_AGE"]
+                response.cache_control.immutable = True
+                static_key = (filename, version)
+        elif request.method == "GET" and response.status_code == 200 and not response.is_streamed:
+            if request.path.startswith("/admin") or response.is_json:
+                # Validate against a weak ETag so repeat visits to unchanged pages get a bodiless 304.
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+                response.add_etag(weak=True)
+                response.make_conditional(request)
+
+        return _compress_response(response, config["COMPRESS_MIN_SIZE"], config["COMPRESS_LEVEL"], static_key)
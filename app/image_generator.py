@@ -4,7 +4,9 @@ import base64
 from flask import current_app
 
 CLIPDROP_API_KEY = os.getenv("CLIPDROP_API_KEY")
-CLIPDROP_API_URL = "https://clipdrop-api.co/text-to-image/v1"
+CLIPDROP_API_URL = os.getenv("CLIPDROP_API_URL", "https://clipdrop-api.co/text-to-image/v1")
+CLIPDROP_TIMEOUT = 45
+PLACEHOLDER_URL = "/static/images/placeholder_error.png"
 
 STYLE = {
     "happiness": "in a vibrant and joyful art style, with bright sunny colors and a soft, golden hour glow.",
@@ -16,19 +18,30 @@ STYLE = {
 }
 
 
-def build_image_url(prompt: str, emotion: str) -> str:
+def build_full_prompt(prompt: str, emotion: str) -> str:
+    """Combines the user's thought with the style for their emotion."""
+    return (
+        f"A digital painting expressing the emotion of '{emotion}', {STYLE.get(emotion, '')}. "
+        f"The painting is a visual metaphor for the following thought: '{prompt}'"
+    )
+
+
+def to_data_url(image_bytes: bytes) -> str:
+    """ClipDrop returns raw image data, which must be Base64 encoded to be used in an <img> tag."""
+    base64_data = base64.b64encode(image_bytes).decode('utf-8')
+    return f"data:image/png;base64,{base64_data}"
+
+
+def request_clipdrop(prompt: str, emotion: str) -> str | None:
     """
     Generates an image using the ClipDrop API and returns it as a Base64 Data URL.
-    Returns a placeholder URL if the API call fails.
+    Returns None if the API call fails.
     """
     if not CLIPDROP_API_KEY:
         current_app.logger.error("ClipDrop API key not set. Cannot generate image.")
-        return "/static/images/placeholder_error.png"
+        return None
 
-    full_prompt = (
-        f"A digital painting expressing the emotion of '{emotion}', {STYLE.get(emotion, '')}. "
-        f"The painting is a visual metaphor for the following thought: '{prompt}'"
-    )
+    full_prompt = build_full_prompt(prompt, emotion)
 
     headers = {
         'x-api-key': CLIPDROP_API_KEY
@@ -41,19 +54,26 @@ def build_image_url(prompt: str, emotion: str) -> str:
     try:
         current_app.logger.info(f"Generating image with ClipDrop prompt: {full_prompt}")
 
-        response = requests.post(CLIPDROP_API_URL, headers=headers, files=payload, timeout=45)
+        response = requests.post(CLIPDROP_API_URL, headers=headers, files=payload, timeout=CLIPDROP_TIMEOUT)
 
         if response.ok:
-            # ClipDrop returns raw image data, which must be Base64 encoded to be used in an <img> tag.
-            image_bytes = response.content
-            base64_data = base64.b64encode(image_bytes).decode('utf-8')
-            return f"data:image/png;base64,{base64_data}"
+            return to_data_url(response.content)
         else:
             error_message = response.json().get('error', response.text)
             current_app.logger.error(f"ClipDrop API Error: {response.status_code} - {error_message}")
-            return "/static/images/placeholder_error.png"
+            return None
 
     except requests.exceptions.RequestException as e:
         # Handle network-level errors like timeouts or connection issues.
         current_app.logger.error(f"A network error occurred with the ClipDrop API: {e}")
-        return "/static/images/placeholder_error.png"
+        return None
+
+
+def build_image_url(prompt: str, emotion: str, on_settled=None) -> str:
+    """
+    Generates an image through the configured providers (see image_providers)
+    and returns it as a Data URL, or a placeholder URL if every provider fails.
+    `on_settled` is called once no upstream request is left running.
+    """
+    from .image_providers import get_router
+    return get_router().generate(prompt, emotion, on_settled=on_settled) or PLACEHOLDER_URL
@@ -0,0 +1,382 @@
+import asyncio
+import base64
+import contextvars
+import hashlib
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+from flask import current_app
+
+from . import image_generator
+from .image_generator import request_clipdrop, to_data_url, CLIPDROP_TIMEOUT
+from .storage import IMAGES, get_storage
+
+
+# ------------------------------
+# Providers
+# ------------------------------
+
+class ImageProvider:
+    """
+    A source of generated images. `generate` returns a Data URL, or None on
+    failure. Subclasses with a native async client also override `agenerate`.
+    """
+    name = "base"
+    # Whether results are worth keeping in the shared image cache.
+    cacheable = True
+    # Local providers render in-process with no network call, so the router
+    # runs them on the request's own thread instead of its upstream pool.
+    local = False
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate(self, prompt: str, emotion: str) -> str | None:
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str, emotion: str) -> str | None:
+        return await asyncio.to_thread(self.generate, prompt, emotion)
+
+
+class ClipDropProvider(ImageProvider):
+    """Stable Diffusion images from the ClipDrop API."""
+    name = "clipdrop"
+
+    def is_available(self) -> bool:
+        return bool(image_generator.CLIPDROP_API_KEY)
+
+    def generate(self, prompt, emotion):
+        return request_clipdrop(prompt, emotion)
+
+    async def agenerate(self, prompt, emotion):
+        # Only the async serving mode needs aiohttp, so import it on first use.
+        from .async_client import request_clipdrop_async
+        return await request_clipdrop_async(prompt, emotion)
+
+
+# Gradient stops for each emotion, dark to light (RGB).
+PALETTES = {
+    "happiness": [(255, 170, 40), (255, 214, 90), (255, 244, 190), (255, 255, 240)],
+    "sadness": [(20, 32, 64), (44, 72, 120), (100, 140, 180), (190, 210, 228)],
+    "anger": [(40, 0, 0), (140, 10, 10), (230, 60, 20), (255, 170, 60)],
+    "disgust": [(38, 44, 24), (84, 96, 40), (140, 150, 70), (196, 190, 130)],
+    "fear": [(8, 6, 18), (40, 24, 64), (86, 60, 110), (160, 150, 170)],
+    "surprise": [(255, 70, 140), (255, 160, 60), (120, 220, 255), (250, 250, 140)],
+}
+
+
+class ProceduralProvider(ImageProvider):
+    """
+    Offline abstract art: an emotion-palette gradient blended with fractal
+    value noise, seeded from the prompt so the same thought gives the same
+    picture. Needs only NumPy, and renders in a few tens of milliseconds.
+    """
+    name = "procedural"
+    # Cheap to re-render, and the same prompt always gives the same picture.
+    cacheable = False
+    local = True
+
+    def __init__(self, size: int = 512):
+        self.size = size
+
+    def generate(self, prompt, emotion):
+        seed = int.from_bytes(hashlib.sha256(f"{emotion}|{prompt}".encode("utf-8")).digest()[:8], "big")
+        rng = np.random.default_rng(seed)
+        field = _art_field(self.size, rng)
+        return to_data_url(_encode_png(_colorize(field, PALETTES.get(emotion, PALETTES["surprise"]))))
+
+
+def _value_noise(size: int, cells: int, rng: np.random.Generator) -> np.ndarray:
+    """Smoothly interpolated random grid of `cells` x `cells` values, scaled up to `size` x `size`."""
+    grid = rng.random((cells + 1, cells + 1))
+    coords = np.linspace(0, cells, size, endpoint=False)
+    i = coords.astype(int)
+    t = coords - i
+    t = t * t * (3 - 2 * t)  # smoothstep
+    top = grid[i][:, i] * (1 - t) + grid[i][:, i + 1] * t
+    bottom = grid[i + 1][:, i] * (1 - t) + grid[i + 1][:, i + 1] * t
+    return top * (1 - t[:, None]) + bottom * t[:, None]
+
+
+def _art_field(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Scalar field in [0, 1]: a diagonal gradient warped by several octaves of noise."""
+    noise = np.zeros((size, size))
+    amplitude, total = 1.0, 0.0
+    for cells in (3, 6, 12, 24):
+        noise += amplitude * _value_noise(size, cells, rng)
+        total += amplitude
+        amplitude *= 0.5
+    noise /= total
+
+    angle = rng.uniform(0, 2 * np.pi)
+    y, x = np.mgrid[0:size, 0:size] / size
+    gradient = (x * np.cos(angle) + y * np.sin(angle))
+    gradient = (gradient - gradient.min()) / (np.ptp(gradient) or 1)
+
+    field = 0.55 * gradient + 0.45 * noise
+    # Soft contour bands give the painting some structure.
+    field += 0.06 * np.sin(field * rng.uniform(14, 28))
+    return np.clip((field - field.min()) / (np.ptp(field) or 1), 0, 1)
+
+
+def _colorize(field: np.ndarray, palette: list[tuple[int, int, int]]) -> np.ndarray:
+    stops = np.linspace(0, 1, len(palette))
+    colors = np.array(palette, dtype=float)
+    channels = [np.interp(field, stops, colors[:, c]) for c in range(3)]
+    return np.stack(channels, axis=-1).astype(np.uint8)
+
+
+def _encode_png(rgb: np.ndarray) -> bytes:
+    """Minimal PNG encoder (8-bit RGB, no filtering)."""
+    height, width, _ = rgb.shape
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgb.reshape(height, -1)], axis=1).tobytes()
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+PROVIDERS = {
+    "clipdrop": ClipDropProvider,
+    "procedural": ProceduralProvider,
+}
+
+
+# ------------------------------
+# Hedged routing
+# ------------------------------
+
+class LatencyTracker:
+    """Rolling window of successful response times for one provider."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self, min_samples: int = 20) -> float | None:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            return float(np.percentile(list(self._samples), 95))
+
+
+class HedgedRouter:
+    """
+    Sends each request to the first available provider. If it has not
+    answered within its own p95 latency (clamped to [min_delay, max_delay]),
+    or it fails, the next provider is fired as well, and whichever succeeds
+    first wins.
+
+    In the blocking path a losing upstream call can't be cancelled and keeps
+    running after `generate` returns; `on_settled` is called once every
+    upstream call it started has finished, so callers can hold their
+    upstream slot until then.
+    """
+
+    def __init__(self, providers: list[ImageProvider], min_delay: float, max_delay: float,
+                 default_delay: float, deadline: float):
+        self.providers = providers
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.deadline = deadline
+        self.trackers = {p.name: LatencyTracker() for p in providers}
+        self._executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="image-provider")
+
+    def hedge_delay(self, provider: ImageProvider) -> float:
+        p95 = self.trackers[provider.name].p95()
+        delay = self.default_delay if p95 is None else p95
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def _available(self) -> list[ImageProvider]:
+        return [p for p in self.providers if p.is_available()]
+
+    # Generated images are kept in the storage backend's "images" bucket, so
+    # the same thought and emotion is only sent upstream once across all hosts.
+
+    @staticmethod
+    def _cache_name(prompt: str, emotion: str) -> str:
+        return hashlib.sha256(f"{emotion}|{prompt}".encode("utf-8")).hexdigest() + ".png"
+
+    def _cache_get(self, prompt: str, emotion: str) -> str | None:
+        if not current_app.config["IMAGE_CACHE"]:
+            return None
+        try:
+            data = get_storage().blob_get(IMAGES, self._cache_name(prompt, emotion))
+        except Exception as e:
+            current_app.logger.error(f"Image cache read failed: {e}")
+            return None
+        if data is not None:
+            current_app.logger.info("Image served from cache")
+            return to_data_url(data)
+        return None
+
+    def _cache_put(self, provider: ImageProvider, prompt: str, emotion: str, data_url: str) -> None:
+        if not current_app.config["IMAGE_CACHE"] or not provider.cacheable:
+            return
+        try:
+            image_bytes = base64.b64decode(data_url.split(",", 1)[1])
+            get_storage().blob_put(IMAGES, self._cache_name(prompt, emotion), image_bytes)
+        except Exception as e:
+            current_app.logger.error(f"Image cache write failed: {e}")
+
+    def _timed(self, provider: ImageProvider, prompt: str, emotion: str) -> str | None:
+        started = time.monotonic()
+        try:
+            result = provider.generate(prompt, emotion)
+        except Exception as e:
+            current_app.logger.error(f"Image provider '{provider.name}' failed: {e}")
+            return None
+        if result is not None:
+            self.trackers[provider.name].record(time.monotonic() - started)
+        return result
+
+    @staticmethod
+    def _when_settled(futures, callback) -> None:
+        """Calls `callback` once every future has finished, from whichever thread finishes the last one."""
+        if callback is None:
+            return
+        if not futures:
+            callback()
+            return
+        context = contextvars.copy_context()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(_future):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                context.run(callback)
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def generate(self, prompt: str, emotion: str, on_settled=None) -> str | None:
+        """Blocking hedged generation. Returns a Data URL, or None if every provider failed."""
+        running = {}
+        try:
+            cached = self._cache_get(prompt, emotion)
+            if cached is not None:
+                return cached
+
+            pending = self._available()
+            give_up_at = time.monotonic() + self.deadline
+
+            while pending or running:
+                # Each pass fires the next provider: at the start, after a failure, or when the hedge delay ran out.
+                if pending:
+                    provider = pending.pop(0)
+                    if running:
+                        current_app.logger.info(f"Hedging image request with provider '{provider.name}'")
+                    if provider.local:
+                        result = self._timed(provider, prompt, emotion)
+                        if result is not None:
+                            current_app.logger.info(f"Image served by provider '{provider.name}'")
+                            self._cache_put(provider, prompt, emotion, result)
+                            return result
+                        continue
+                    # Each task gets its own copy of the context so current_app works in the worker thread.
+                    future = self._executor.submit(contextvars.copy_context().run, self._timed, provider, prompt, emotion)
+                    running[future] = provider
+
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                timeout = min(remaining, self.hedge_delay(provider)) if pending else remaining
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    winner = running.pop(future)
+                    result = future.result()
+                    if result is not None:
+                        current_app.logger.info(f"Image served by provider '{winner.name}'")
+                        self._cache_put(winner, prompt, emotion, result)
+                        return result
+            return None
+        finally:
+            self._when_settled(list(running), on_settled)
+
+    async def agenerate(self, prompt: str, emotion: str) -> str | None:
+        """Async hedged generation; losing requests are cancelled."""
+        cached = await asyncio.to_thread(self._cache_get, prompt, emotion)
+        if cached is not None:
+            return cached
+
+        pending = self._available()
+        running: dict[asyncio.Task, ImageProvider] = {}
+        give_up_at = time.monotonic() + self.deadline
+
+        async def timed(provider):
+            started = time.monotonic()
+            try:
+                result = await provider.agenerate(prompt, emotion)
+            except Exception as e:
+                current_app.logger.error(f"Image provider '{provider.name}' failed: {e}")
+                return None
+            if result is not None:
+                self.trackers[provider.name].record(time.monotonic() - started)
+            return result
+
+        try:
+            while pending or running:
+                if pending:
+                    provider = pending.pop(0)
+                    running[asyncio.create_task(timed(provider))] = provider
+                    if len(running) > 1:
+                        current_app.logger.info(f"Hedging image request with provider '{provider.name}'")
+
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                timeout = min(remaining, self.hedge_delay(provider)) if pending else remaining
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    winner = running.pop(task)
+                    result = task.result()
+                    if result is not None:
+                        current_app.logger.info(f"Image served by provider '{winner.name}'")
+                        await asyncio.to_thread(self._cache_put, winner, prompt, emotion, result)
+                        return result
+            return None
+        finally:
+            for task in running:
+                task.cancel()
+
+
+def get_router() -> HedgedRouter:
+    """Returns the app's router, building it from config on first use."""
+    router = current_app.extensions.get("image_router")
+    if router is None:
+        config = current_app.config
+        providers = []
+        for name in config["IMAGE_PROVIDERS"]:
+            if name not in PROVIDERS:
+                current_app.logger.error(f"Unknown image provider '{name}' in IMAGE_PROVIDERS")
+                continue
+            if name == "procedural":
+                providers.append(ProceduralProvider(size=config["PROCEDURAL_IMAGE_SIZE"]))
+            else:
+                providers.append(PROVIDERS[name]())
+        router = HedgedRouter(
+            providers,
+            min_delay=config["HEDGE_MIN_DELAY_SECONDS"],
+            max_delay=config["HEDGE_MAX_DELAY_SECONDS"],
+            default_delay=config["HEDGE_DEFAULT_DELAY_SECONDS"],
+            deadline=CLIPDROP_TIMEOUT,
+        )
+        current_app.extensions["image_router"] = router
+    return router
@@ -1,12 +1,13 @@
 import json
 import datetime as dt
 from flask import current_app
-from .utils import get_db
+from . import events
+from .utils import get_db, to_ms
 
 
-def _now_str() -> str:
-    """Returns the current time as an ISO 8601 formatted string."""
-    return dt.datetime.now().isoformat()
+def _now() -> dt.datetime:
+    """Returns the current local time."""
+    return dt.datetime.now()
 
 
 def log_event(event: str, user: str | None = None, data: dict | None = None, source: str | None = None) -> None:
@@ -15,10 +16,12 @@ def log_event(event: str, user: str | None = None, data: dict | None = None, sou
     """
     app = current_app._get_current_object()
 
+    now = _now()
     record = {
-        "timestamp": _now_str(),
+        "timestamp": now.isoformat(),
+        "ts_ms": to_ms(now),
         "event": str(event),
-        "user": "" if user is None else str(user),
+        "user": "" if user is None else str(user).strip().lower(),
         "source": "" if source is None else str(source),
         # Convert the data dictionary to a JSON string for database storage.
         "data": json.dumps(data) if data is not None else None,
@@ -26,13 +29,14 @@ def log_event(event: str, user: str | None = None, data: dict | None = None, sou
 
     try:
         db = get_db()
-        db.execute(
+        cursor = db.execute(
             """
-            INSERT INTO logs (timestamp, event, user, source, data)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO logs (timestamp, ts_ms, event, user, source, data)
+            VALUES (?, ?, ?, ?, ?, ?)
             """,
             (
                 record["timestamp"],
+                record["ts_ms"],
                 record["event"],
                 record["user"],
                 record["source"],
@@ -43,3 +47,6 @@ def log_event(event: str, user: str | None = None, data: dict | None = None, sou
     except Exception as e:
         # If the database write fails, log the error to the console for debugging.
         app.logger.error(f"Failed to write to logs database: {e}")
+        return
+
+    events.publish("log", dict(record, id=cursor.lastrowid))
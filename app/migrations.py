@@ -0,0 +1,242 @@
+import sqlite3
+
+# Tables the app expects. Kept in sync with init_db.py, which calls migrate().
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT DEFAULT (datetime('now','localtime')),
+        timestamp TEXT,
+        event TEXT NOT NULL,
+        user TEXT,
+        source TEXT,
+        data TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        emotion TEXT,
+        prompt TEXT,
+        image_url TEXT,
+        advice TEXT,
+        predicted_correct INTEGER,
+        advice_ok INTEGER,
+        comments TEXT,
+        created_at TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY NOT NULL,
+        value TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS presence (
+        username TEXT PRIMARY KEY NOT NULL,
+        last_seen_ms INTEGER NOT NULL,
+        last_login_ms INTEGER
+    )
+    """,
+    # Deleted logs/feedback rows, for the change feed (app/changefeed.py).
+    """
+    CREATE TABLE IF NOT EXISTS tombstones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        ts_ms INTEGER NOT NULL
+    )
+    """,
+    # Local storage backend (app/storage/local.py): key-value, locks, rate limits and pub/sub.
+    """
+    CREATE TABLE IF NOT EXISTS kv_store (
+        key TEXT PRIMARY KEY NOT NULL,
+        value TEXT,
+        expires_ms INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS storage_locks (
+        name TEXT PRIMARY KEY NOT NULL,
+        owner TEXT NOT NULL,
+        expires_ms INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS storage_buckets (
+        key TEXT PRIMARY KEY NOT NULL,
+        tokens REAL NOT NULL,
+        updated_ms INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS storage_slots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        owner TEXT,
+        acquired_ms INTEGER NOT NULL,
+        expires_ms INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pubsub_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel TEXT NOT NULL,
+        payload TEXT,
+        ts_ms INTEGER NOT NULL
+    )
+    """,
+]
+
+# Converts a local-time text timestamp (either SQLite's "YYYY-MM-DD HH:MM:SS" or
+# Python's isoformat) into epoch milliseconds.
+_TEXT_TO_MS = "CAST(ROUND((julianday({col}, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+# Columns added after the initial schema: (table, column, type, backfill expression).
+COLUMNS = [
+    ("logs", "ts_ms", "INTEGER",
+     _TEXT_TO_MS.format(col="COALESCE(timestamp, created_at)")),
+    ("feedback", "ts_ms", "INTEGER",
+     _TEXT_TO_MS.format(col="created_at")),
+]
+
+# Columns that are no longer kept: (table, column). Dropped if present.
+DROPPED_COLUMNS = [
+    # Tombstones only need the row id; keeping the name would retain it after the user was deleted.
+    ("tombstones", "username"),
+]
+
+# Tables that are no longer kept. Dropped if present.
+DROPPED_TABLES = [
+    # Rate limits moved to the storage backend (storage_buckets, storage_slots).
+    "rate_buckets",
+    "upstream_leases",
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_logs_ts_ms ON logs (ts_ms)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_user_ts_ms ON logs (user, ts_ms)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_event_ts_ms ON logs (event, ts_ms)",
+    "CREATE INDEX IF NOT EXISTS idx_feedback_ts_ms ON feedback (ts_ms)",
+    "CREATE INDEX IF NOT EXISTS idx_feedback_username_ts_ms ON feedback (username, ts_ms)",
+    "CREATE INDEX IF NOT EXISTS idx_presence_last_seen_ms ON presence (last_seen_ms)",
+    "CREATE INDEX IF NOT EXISTS idx_storage_slots_name_expires_ms ON storage_slots (name, expires_ms)",
+    "CREATE INDEX IF NOT EXISTS idx_pubsub_messages_ts_ms ON pubsub_messages (ts_ms)",
+]
+
+# Seeds a newly created table from existing data: {table: statement}.
+SEEDS = {
+    "presence": """
+        INSERT OR IGNORE INTO presence (username, last_seen_ms, last_login_ms)
+        SELECT user, MAX(ts_ms), MAX(CASE WHEN event = 'login_success' THEN ts_ms END)
+        FROM logs WHERE user IS NOT NULL AND user != '' AND ts_ms IS NOT NULL
+        GROUP BY user
+    """,
+    # Settings moved from the settings table to the key-value store.
+    "kv_store": """
+        INSERT OR IGNORE INTO kv_store (key, value, expires_ms)
+        SELECT 'setting:' || key, value, NULL FROM settings
+    """,
+}
+
+
+class MigrationError(RuntimeError):
+    """Raised when a data migration can't be applied safely; it (and every later one) is left unapplied."""
+
+
+def _check_username_case(usernames: list[str]) -> None:
+    """Refuses to lower-case stored usernames while two accounts differ only in case."""
+    groups: dict[str, set[str]] = {}
+    for name in usernames:
+        groups.setdefault(name.strip().lower(), set()).add(name.strip())
+    collisions = sorted(sorted(names) for names in groups.values() if len(names) > 1)
+    if collisions:
+        listed = "; ".join(" / ".join(names) for names in collisions)
+        raise MigrationError(
+            f"The users file has accounts whose names differ only in case ({listed}). Lower-casing "
+            "the stored usernames would merge their logs and feedback: rename or remove one account "
+            "of each pair, then restart. Until then, deleting a user only removes rows stored in lower case."
+        )
+
+
+# One-off data fixes, applied once each in order: (check, statements). The
+# check gets the account names from the users file and raises MigrationError
+# to stop the migration. PRAGMA user_version records how many have run.
+DATA_MIGRATIONS = [
+    # Usernames are stored lower-cased, as at login, so lookups can match them
+    # exactly and use the username indexes. Presence rows that differ only in
+    # case are merged. This can't be undone.
+    (_check_username_case, [
+        "UPDATE logs SET user = lower(trim(user)) WHERE user != lower(trim(user))",
+        "UPDATE feedback SET username = lower(trim(username)) WHERE username != lower(trim(username))",
+        """
+        INSERT INTO presence (username, last_seen_ms, last_login_ms)
+        SELECT lower(trim(username)), MAX(last_seen_ms), MAX(last_login_ms)
+        FROM presence WHERE username != lower(trim(username))
+        GROUP BY lower(trim(username))
+        ON CONFLICT(username) DO UPDATE SET
+            last_seen_ms = MAX(last_seen_ms, excluded.last_seen_ms),
+            last_login_ms = COALESCE(MAX(last_login_ms, excluded.last_login_ms), last_login_ms, excluded.last_login_ms)
+        """,
+        "DELETE FROM presence WHERE username != lower(trim(username))",
+    ]),
+]
+
+
+def _has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _has_table(conn: sqlite3.Connection, table: str) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    """
+    Brings the database schema up to date. Safe to run on every start-up:
+    tables and indexes are only created if missing, new columns are added
+    and backfilled once, and retired columns and tables are dropped. Data migrations
+    run separately (migrate_data), once the users file can be read.
+    """
+    new_tables = [table for table in SEEDS if not _has_table(conn, table)]
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+    for table, column, col_type, backfill in COLUMNS:
+        if not _has_column(conn, table, column):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+        # Rows written by older code (or by hand) are filled in from their text timestamps.
+        conn.execute(f"UPDATE {table} SET {column} = {backfill} WHERE {column} IS NULL")
+
+    for table, column in DROPPED_COLUMNS:
+        if _has_column(conn, table, column):
+            conn.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+    for table in DROPPED_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+    for statement in INDEXES:
+        conn.execute(statement)
+
+    for table in new_tables:
+        conn.execute(SEEDS[table])
+
+    conn.commit()
+
+
+def migrate_data(conn: sqlite3.Connection, usernames: list[str]) -> None:
+    """
+    Applies the data migrations this database hasn't had yet, each in its
+    own transaction. `usernames` are the account names from the users file,
+    as written there. Raises MigrationError if a migration's check fails.
+    """
+    applied = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, (check, statements) in enumerate(DATA_MIGRATIONS[applied:], start=applied + 1):
+        check(usernames)
+        with conn:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
@@ -1,8 +1,14 @@
 import os
+import csv
+import io
 import json
-from typing import Dict, List
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List
 from werkzeug.security import check_password_hash, generate_password_hash
 from json import JSONDecodeError
+from ..storage import CREDENTIALS, get_storage
+from ..utils import now_ms
 
 # Public constant used by templates/routes
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin").lower()
@@ -12,28 +18,30 @@ ADMIN_PASSWORD_PLAIN = os.getenv("ADMIN_PASSWORD")
 USERS_FILE_ENV = os.getenv("USERS_JSON", "users.json")
 ADMIN_PWD_HASH_FILE = "admin_pwd.hash"
 
-# In-memory cache for user credentials
+# Batches smaller than this are hashed in-process; starting a pool costs more than it saves.
+PARALLEL_HASH_MIN_BATCH = 8
+# Usernames per DELETE statement in bulk purges (well under SQLite's bound-parameter limit).
+DELETE_CHUNK_SIZE = 500
+MAX_USERNAME_LENGTH = 64
+
+# In-memory cache for user credentials. Each process keeps its own copy;
+# changes are announced on the storage "users" channel so the others reload.
 _USERS_CACHE: Dict[str, str] = {}
 
 
-def _possible_user_paths() -> List[str]:
-    """Generates a list of possible paths for the users.json file."""
-    here = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.abspath(os.path.join(here, "..", ".."))
-    return [
-        os.path.join(project_root, "data", "users.json"),
-        os.path.join(project_root, USERS_FILE_ENV),
-    ]
+def _possible_user_files() -> List[str]:
+    """Possible names of the users.json file in the credentials store (relative to the project root)."""
+    return ["data/users.json", USERS_FILE_ENV]
 
 
 def _load_users_from_file() -> Dict[str, str]:
     """Load users from a JSON file. Returns {} if not found or invalid."""
-    for path in _possible_user_paths():
-        if not os.path.exists(path):
+    for name in _possible_user_files():
+        data = get_storage().blob_get(CREDENTIALS, name)
+        if data is None:
             continue
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                records = json.load(f)
+            records = json.loads(data.decode("utf-8"))
             if not isinstance(records, list):
                 continue
 
@@ -45,20 +53,16 @@ def _load_users_from_file() -> Dict[str, str]:
                     if isinstance(u, str) and isinstance(h, str):
                         result[u.strip().lower()] = h
             return result
-        except (JSONDecodeError, TypeError, IOError):
+        except (JSONDecodeError, TypeError, UnicodeDecodeError):
             continue
     return {}
 
 
 def _fallback_env_user() -> Dict[str, str]:
     """Create a single admin user from env vars or a hash file."""
-    here = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.abspath(os.path.join(here, "..", ".."))
-    hash_file_path = os.path.join(project_root, ADMIN_PWD_HASH_FILE)
-
-    if os.path.exists(hash_file_path):
-        with open(hash_file_path, "r", encoding="utf-8") as f:
-            return {ADMIN_USERNAME: f.read().strip()}
+    stored_hash = get_storage().blob_get(CREDENTIALS, ADMIN_PWD_HASH_FILE)
+    if stored_hash is not None:
+        return {ADMIN_USERNAME: stored_hash.decode("utf-8").strip()}
 
     if ADMIN_PASSWORD_HASH:
         return {ADMIN_USERNAME: ADMIN_PASSWORD_HASH}
@@ -87,6 +91,24 @@ def refresh_users_cache() -> None:
     _ensure_users_loaded()
 
 
+def invalidate_users_cache() -> None:
+    """Drops the cached users; the next lookup reloads them. Called when another process changes them."""
+    global _USERS_CACHE
+    _USERS_CACHE = {}
+
+
+def _users_changed() -> None:
+    """Reloads this process's cache and tells every other process to drop theirs."""
+    refresh_users_cache()
+    get_storage().publish("users")
+
+
+def set_admin_password_hash(password_hash: str) -> None:
+    """Stores a new admin password hash, replacing any from the environment."""
+    get_storage().blob_put(CREDENTIALS, ADMIN_PWD_HASH_FILE, password_hash.encode("utf-8"))
+    _users_changed()
+
+
 def verify_credentials(username: str, password: str) -> bool:
     """Return True when username exists and password matches (case-insensitive username)."""
     _ensure_users_loaded()
@@ -105,41 +127,204 @@ def verify_credentials(username: str, password: str) -> bool:
         return False
 
 
-def delete_user_data(username: str, db_conn) -> bool:
+def _read_user_records() -> tuple:
     """
-    Deletes a user from the users.json file and all their associated data
-    from the feedback and logs tables in the database.
+    Returns (name, records) for the users file in use, or the default name
+    and no records if none exists yet.
     """
-    uname_lower = username.lower()
-    if uname_lower == ADMIN_USERNAME:
-        return False
+    storage = get_storage()
+    for name in _possible_user_files():
+        data = storage.blob_get(CREDENTIALS, name)
+        if data is not None:
+            records = json.loads(data.decode("utf-8"))
+            return name, records if isinstance(records, list) else []
+    return _possible_user_files()[0], []
+
 
-    # 1. Remove user from the users.json file
-    user_file_path = next((path for path in _possible_user_paths() if os.path.exists(path)), None)
+def stored_usernames() -> List[str]:
+    """Usernames exactly as written in the users file (not normalised); [] if it can't be read."""
+    try:
+        _, records = _read_user_records()
+    except (JSONDecodeError, UnicodeDecodeError):
+        return []
+    return [rec["username"] for rec in records if isinstance(rec, dict) and isinstance(rec.get("username"), str)]
 
-    if user_file_path:
-        with open(user_file_path, "r", encoding="utf-8") as f:
-            users = json.load(f)
 
-        users_after_deletion = [
-            user for user in users
-            if user.get("username", "").lower() != uname_lower
-        ]
+def _write_user_records(name: str, records: List[dict]) -> None:
+    """Writes the users file in one piece (the store never exposes a half-written file)."""
+    get_storage().blob_put(CREDENTIALS, name, json.dumps(records, indent=2).encode("utf-8"))
 
-        with open(user_file_path, "w", encoding="utf-8") as f:
-            json.dump(users_after_deletion, f, indent=2)
 
-    # 2. Delete user data from the database
+def hash_passwords(passwords: List[str], workers: int | None = None) -> List[str]:
+    """
+    Hashes passwords with generate_password_hash. scrypt is deliberately slow
+    and CPU-bound, so larger batches are spread over a process pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    if len(passwords) < PARALLEL_HASH_MIN_BATCH or workers == 1:
+        return [generate_password_hash(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    # Forking a threaded server process can copy locks held by other threads
+    # into the child; spawned workers start clean.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+def read_users_csv(text: str) -> List[tuple]:
+    """
+    Parses CSV text into (username, password) rows. A header row naming
+    'username' and 'password' is optional; blank lines are ignored.
+    """
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if rows and [cell.strip().lower() for cell in rows[0][:2]] == ["username", "password"]:
+        rows = rows[1:]
+    return [(row[0].strip(), row[1] if len(row) > 1 else "") for row in rows]
+
+
+def read_usernames_csv(text: str) -> List[str]:
+    """Parses usernames from the first column of CSV text (an optional 'username' header is skipped)."""
+    names = [row[0].strip() for row in csv.reader(io.StringIO(text)) if row and row[0].strip()]
+    if names and names[0].lower() == "username":
+        names = names[1:]
+    return names
+
+
+def _index_records(records: List[dict]) -> Dict[str, int]:
+    return {
+        rec.get("username", "").strip().lower(): i
+        for i, rec in enumerate(records) if isinstance(rec, dict)
+    }
+
+
+def bulk_create_users(rows: Iterable[tuple], overwrite: bool = False, workers: int | None = None) -> Dict[str, list]:
+    """
+    Adds users from (username, password) pairs. Existing users are skipped
+    unless `overwrite` is set, in which case their password is replaced.
+    Passwords are hashed in parallel and the users file is written once.
+
+    Returns {"created": [...], "updated": [...], "skipped": [(username, reason), ...]}.
+    """
+    _, records = _read_user_records()
+    existing = _index_records(records)
+
+    result = {"created": [], "updated": [], "skipped": []}
+    pending: Dict[str, str] = {}
+    for username, password in rows:
+        uname = (username or "").strip().lower()
+        if not uname or len(uname) > MAX_USERNAME_LENGTH or any(c.isspace() for c in uname):
+            result["skipped"].append((username, "invalid username"))
+        elif not password:
+            result["skipped"].append((uname, "empty password"))
+        elif uname == ADMIN_USERNAME:
+            result["skipped"].append((uname, "reserved for the admin"))
+        elif uname in pending:
+            result["skipped"].append((uname, "duplicate in batch"))
+        elif uname in existing and not overwrite:
+            result["skipped"].append((uname, "already exists"))
+        else:
+            pending[uname] = password
+
+    if not pending:
+        return result
+
+    # Hash before taking the lock; the file is re-read under it in case another batch landed meanwhile.
+    hashes = hash_passwords(list(pending.values()), workers=workers)
+    with get_storage().lock("users-file"):
+        name, records = _read_user_records()
+        existing = _index_records(records)
+        for uname, password_hash in zip(pending, hashes):
+            if uname not in existing:
+                records.append({"username": uname, "password_hash": password_hash})
+                result["created"].append(uname)
+            elif overwrite:
+                records[existing[uname]]["password_hash"] = password_hash
+                result["updated"].append(uname)
+            else:
+                result["skipped"].append((uname, "already exists"))
+        if result["created"] or result["updated"]:
+            _write_user_records(name, records)
+
+    _users_changed()
+    return result
+
+
+def purge_user_rows(usernames: List[str], db_conn) -> None:
+    """
+    Deletes the users' feedback, logs and presence rows in a single
+    transaction, in chunks of DELETE_CHUNK_SIZE names per statement.
+    Deleted feedback and log rows are recorded as tombstones for the change
+    feed. Usernames are stored lower-cased (see migrations.DATA_MIGRATIONS),
+    so they are matched exactly and the username indexes are used. Rolls
+    back and re-raises on failure.
+    """
+    lowered = sorted({u.strip().lower() for u in usernames})
+    deleted_ms = now_ms()
+    # The connection context manager commits once at the end, or rolls back on error.
+    with db_conn:
+        for start in range(0, len(lowered), DELETE_CHUNK_SIZE):
+            chunk = lowered[start:start + DELETE_CHUNK_SIZE]
+            marks = ",".join("?" * len(chunk))
+            db_conn.execute(
+                f"INSERT INTO tombstones (table_name, row_id, ts_ms) "
+                f"SELECT 'feedback', id, ? FROM feedback WHERE username IN ({marks}) ORDER BY id",
+                [deleted_ms, *chunk]
+            )
+            db_conn.execute(
+                f"INSERT INTO tombstones (table_name, row_id, ts_ms) "
+                f"SELECT 'logs', id, ? FROM logs WHERE user IN ({marks}) ORDER BY id",
+                [deleted_ms, *chunk]
+            )
+            db_conn.execute(f"DELETE FROM feedback WHERE username IN ({marks})", chunk)
+            db_conn.execute(f"DELETE FROM logs WHERE user IN ({marks})", chunk)
+            db_conn.execute(f"DELETE FROM presence WHERE username IN ({marks})", chunk)
+
+
+def bulk_delete_users(usernames: Iterable[str], db_conn) -> List[str] | None:
+    """
+    Deletes users from the users file and all their feedback, logs and
+    presence data. The database purge is one transaction and the users file
+    is written once, after the purge has committed. The admin is never
+    deleted.
+
+    Returns the usernames that were deleted, or None if the database purge
+    failed (in which case nothing was changed).
+    """
+    targets = []
+    for username in usernames:
+        uname = (username or "").strip().lower()
+        if uname and uname != ADMIN_USERNAME and uname not in targets:
+            targets.append(uname)
+    if not targets:
+        return []
+
+    # 1. Delete user data from the database
     try:
-        db_conn.execute("DELETE FROM feedback WHERE username = ?", (username,))
-        db_conn.execute("DELETE FROM logs WHERE user = ?", (username,))
-        db_conn.commit()
+        purge_user_rows(targets, db_conn)
     except Exception:
         # If the database operation fails, the deletion is not successful.
-        return False
+        return None
+
+    # 2. Remove the users from the users.json file
+    doomed = set(targets)
+    with get_storage().lock("users-file"):
+        name, records = _read_user_records()
+        remaining = [
+            rec for rec in records
+            if not (isinstance(rec, dict) and rec.get("username", "").strip().lower() in doomed)
+        ]
+        if len(remaining) != len(records):
+            _write_user_records(name, remaining)
 
-    # 3. Refresh the in-memory cache to reflect the deletion
-    refresh_users_cache()
+    # 3. Refresh the in-memory caches (in every process) to reflect the deletion
+    _users_changed()
+    return targets
 
-    return True
 
+def delete_user_data(username: str, db_conn) -> bool:
+    """
+    Deletes a user from the users.json file and all their associated data
+    from the feedback, logs and presence tables in the database.
+    """
+    if (username or "").strip().lower() == ADMIN_USERNAME:
+        return False
+    return bool(bulk_delete_users([username], db_conn))
@@ -0,0 +1,102 @@
+import threading
+from flask import current_app
+from .utils import get_db, now_ms
+
+# Per-process record of when each user's heartbeat was last written, used to
+# throttle writes to at most one per PRESENCE_HEARTBEAT_SECONDS.
+_LAST_BEAT: dict[str, int] = {}
+_LOCK = threading.Lock()
+
+
+def _due(username: str, now: int) -> bool:
+    """Returns True (and claims the slot) if the user's heartbeat should be written."""
+    interval_ms = int(current_app.config.get("PRESENCE_HEARTBEAT_SECONDS", 60)) * 1000
+    with _LOCK:
+        if now - _LAST_BEAT.get(username, 0) < interval_ms:
+            return False
+        _LAST_BEAT[username] = now
+        return True
+
+
+def heartbeat(username: str) -> None:
+    """Marks a user as seen now. Cheap to call on every request."""
+    username = (username or "").strip().lower()
+    if not username:
+        return
+    now = now_ms()
+    if not _due(username, now):
+        return
+    try:
+        db = get_db()
+        db.execute(
+            """
+            INSERT INTO presence (username, last_seen_ms) VALUES (?, ?)
+            ON CONFLICT(username) DO UPDATE SET last_seen_ms = excluded.last_seen_ms
+            """,
+            (username, now)
+        )
+        db.commit()
+    except Exception as e:
+        current_app.logger.error(f"Failed to write presence heartbeat: {e}")
+
+
+def record_login(username: str) -> None:
+    """Records a successful login, which also counts as a heartbeat."""
+    username = (username or "").strip().lower()
+    if not username:
+        return
+    now = now_ms()
+    with _LOCK:
+        _LAST_BEAT[username] = now
+    try:
+        db = get_db()
+        db.execute(
+            """
+            INSERT INTO presence (username, last_seen_ms, last_login_ms) VALUES (?, ?, ?)
+            ON CONFLICT(username) DO UPDATE SET last_seen_ms = excluded.last_seen_ms,
+                                                last_login_ms = excluded.last_login_ms
+            """,
+            (username, now, now)
+        )
+        db.commit()
+    except Exception as e:
+        current_app.logger.error(f"Failed to record login presence: {e}")
+
+
+def forget(usernames: list[str]) -> None:
+    """Drops the throttle entries for users whose data has been deleted."""
+    with _LOCK:
+        for username in usernames:
+            _LAST_BEAT.pop(username, None)
+
+
+def online_count(minutes: int = 30) -> int:
+    """Number of users seen within the last `minutes` (index range scan on last_seen_ms)."""
+    since = now_ms() - minutes * 60 * 1000
+    row = get_db().execute("SELECT COUNT(*) FROM presence WHERE last_seen_ms >= ?", (since,)).fetchone()
+    return row[0] or 0
+
+
+def active_users(days: int = 7, exclude: str | None = None) -> list[dict]:
+    """Users seen within the last `days`, most recent first."""
+    since = now_ms() - days * 24 * 60 * 60 * 1000
+    rows = get_db().execute(
+        """
+        SELECT username, last_seen_ms, last_login_ms FROM presence
+        WHERE last_seen_ms >= ? AND username != ? ORDER BY last_seen_ms DESC
+        """,
+        (since, exclude or "")
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def all_users(exclude: str | None = None) -> list[dict]:
+    """Every user with a presence record, most recently seen first."""
+    rows = get_db().execute(
+        """
+        SELECT username, last_seen_ms, last_login_ms FROM presence
+        WHERE username != ? ORDER BY last_seen_ms DESC
+        """,
+        (exclude or "",)
+    ).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,60 @@
+import math
+import os
+import socket
+from .storage import get_storage
+from .utils import now_ms
+
+# Rate-limit state lives in the storage backend, so every worker (and, with a
+# networked backend, every host) sees the same buckets and in-flight slots.
+
+# Slots for calls to the image providers, shared by all workers.
+UPSTREAM_SLOTS = "upstream"
+
+
+def take_token(key: str, rate_per_minute: float, burst: int) -> tuple[bool, int]:
+    """
+    Tries to take one token from the bucket identified by `key`.
+
+    Buckets hold at most `burst` tokens and refill continuously at
+    `rate_per_minute`. Returns (allowed, retry_after_seconds); the retry hint
+    is 0 when the request is allowed.
+    """
+    allowed, tokens = get_storage().bucket_take(key, rate_per_minute, burst)
+    if allowed:
+        return True, 0
+    if rate_per_minute <= 0:
+        return False, 60
+    retry_after = math.ceil((1 - tokens) * 60 / rate_per_minute)
+    return False, max(1, retry_after)
+
+
+def acquire_slot(capacity: int, lease_seconds: int) -> str | None:
+    """
+    Claims one of `capacity` global in-flight slots. Returns a lease id, or
+    None if all slots are taken. Leases expire after `lease_seconds` so a
+    crashed worker cannot hold a slot forever.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    return get_storage().slot_acquire(UPSTREAM_SLOTS, capacity, lease_seconds, owner)
+
+
+def release_slot(lease_id: str) -> None:
+    """Returns an in-flight slot."""
+    get_storage().slot_release(UPSTREAM_SLOTS, lease_id)
+
+
+def usage_snapshot(rate_per_minute: float, burst: int) -> dict:
+    """Current bucket levels and in-flight leases for the admin usage page."""
+    now = now_ms()
+    rate_per_ms = rate_per_minute / 60000.0
+    storage = get_storage()
+    buckets = []
+    for bucket in storage.bucket_levels():
+        tokens = min(burst, bucket["tokens"] + (now - bucket["updated_ms"]) * rate_per_ms)
+        buckets.append({
+            "key": bucket["key"],
+            "tokens": round(tokens, 2),
+            "used": round(burst - tokens, 2),
+            "updated_ms": bucket["updated_ms"],
+        })
+    return {"buckets": buckets, "leases": storage.slot_list(UPSTREAM_SLOTS)}
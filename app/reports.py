@@ -0,0 +1,179 @@
+import numpy as np
+from flask import current_app
+from . import snapshot
+from .analytics import DAY, TTLCache, local_offset_minutes
+from .models.user import ADMIN_USERNAME
+from .utils import now_ms
+
+# Feedback and retention reports for the admin Feedback page, computed with
+# NumPy over the columnar snapshot (app/snapshot.py). Each report is a few
+# masked passes over the columns it needs, grouped with bincount, so the cost
+# grows with the row count but no SQL is run beyond the incremental refresh.
+
+WEEK = 7 * DAY
+# 1970-01-05 was a Monday: weeks start on Monday, local time.
+WEEK_ORIGIN = 4 * DAY
+STEPS = {"day": (DAY, 0), "week": (WEEK, WEEK_ORIGIN)}
+MAX_BUCKETS = 1000
+
+
+def _buckets(ts_ms: np.ndarray, granularity: str, tz_offset_minutes: int) -> np.ndarray:
+    """Index of the local day or week each timestamp falls in."""
+    step, origin = STEPS[granularity]
+    return (ts_ms + tz_offset_minutes * 60 * 1000 - origin) // step
+
+
+def _bucket_start_ms(index: int, granularity: str, tz_offset_minutes: int) -> int:
+    step, origin = STEPS[granularity]
+    return int(index * step + origin - tz_offset_minutes * 60 * 1000)
+
+
+def _rate(hits: np.ndarray, totals: np.ndarray) -> list:
+    """hits / totals rounded to 4 places, with None where there is nothing to divide."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.round(hits / totals, 4)
+    return [float(r) if n else None for r, n in zip(rates, totals)]
+
+
+def accuracy(view, granularity="week", tz_offset_minutes=0) -> dict:
+    """How often the predicted emotion was confirmed, per emotion and per day or week."""
+    fb = view.tables["feedback"]
+    mask = (fb["alive"] == 1) & (fb["predicted_correct"] >= 0) & (fb["emotion"] >= 0)
+    emotions, correct = fb["emotion"][mask], fb["predicted_correct"][mask]
+    bucket = _buckets(fb["ts_ms"][mask], granularity, tz_offset_minutes)
+    names = view.dictionaries["emotions"]
+    if bucket.size == 0:
+        return {"granularity": granularity, "buckets": [], "series": [], "overall": []}
+
+    # Only the most recent MAX_BUCKETS periods are charted.
+    first = max(int(bucket.min()), int(bucket.max()) - MAX_BUCKETS + 1)
+    keep = bucket >= first
+    n_buckets = int(bucket.max()) - first + 1
+    key = emotions[keep].astype(np.int64) * n_buckets + (bucket[keep] - first)
+    size = len(names) * n_buckets
+    totals = np.bincount(key, minlength=size).reshape(len(names), n_buckets)
+    hits = np.bincount(key, weights=correct[keep], minlength=size).reshape(len(names), n_buckets)
+
+    all_totals = np.bincount(emotions, minlength=len(names))
+    all_hits = np.bincount(emotions, weights=correct, minlength=len(names))
+    present = [code for code in range(len(names)) if all_totals[code]]
+    overall_rates = _rate(all_hits, all_totals)
+    return {
+        "granularity": granularity,
+        "buckets": [_bucket_start_ms(first + i, granularity, tz_offset_minutes) for i in range(n_buckets)],
+        "series": [
+            {"emotion": names[code], "n": totals[code].tolist(), "rate": _rate(hits[code], totals[code])}
+            for code in present
+        ],
+        "overall": [
+            {"emotion": names[code], "n": int(all_totals[code]), "rate": overall_rates[code]}
+            for code in present
+        ],
+    }
+
+
+def advice(view) -> dict:
+    """How often each advice text was marked helpful, with the emotion it was given for."""
+    fb = view.tables["feedback"]
+    mask = (fb["alive"] == 1) & (fb["advice"] >= 0) & (fb["advice_ok"] >= 0)
+    advice_names, emotion_names = view.dictionaries["advice"], view.dictionaries["emotions"]
+    n_emotions = len(emotion_names) + 1  # the extra slot holds feedback without an emotion
+    emotion_codes = np.where(fb["emotion"][mask] >= 0, fb["emotion"][mask], n_emotions - 1)
+    key = fb["advice"][mask].astype(np.int64) * n_emotions + emotion_codes
+    size = len(advice_names) * n_emotions
+    shown = np.bincount(key, minlength=size)
+    accepted = np.bincount(key, weights=fb["advice_ok"][mask] == 1, minlength=size)
+
+    keys = np.flatnonzero(shown)
+    keys = keys[np.argsort(-shown[keys], kind="stable")]
+    rates = _rate(accepted[keys], shown[keys])
+    return {
+        "rows": [
+            {
+                "advice": advice_names[k // n_emotions],
+                "emotion": emotion_names[k % n_emotions] if k % n_emotions < len(emotion_names) else None,
+                "shown": int(shown[k]),
+                "accepted": int(accepted[k]),
+                "rate": rate,
+            }
+            for k, rate in zip(keys.tolist(), rates)
+        ],
+    }
+
+
+def retention(view, weeks=8, cohorts=12, tz_offset_minutes=0, now_ms=None) -> dict:
+    """
+    Weekly cohorts by first activity (any log event or feedback): for each of
+    the latest `cohorts` cohorts, how many of its users were active 0..`weeks`
+    weeks later. Weeks that haven't happened yet are None.
+    """
+    logs, fb = view.tables["logs"], view.tables["feedback"]
+    admin = view.code("users", ADMIN_USERNAME)
+    parts_user, parts_ts = [], []
+    for table in (logs, fb):
+        mask = (table["alive"] == 1) & (table["user"] >= 0) & (table["user"] != admin) & (table["ts_ms"] >= 0)
+        parts_user.append(table["user"][mask])
+        parts_ts.append(table["ts_ms"][mask])
+    users = np.concatenate(parts_user).astype(np.int64)
+    week = _buckets(np.concatenate(parts_ts), "week", tz_offset_minutes)
+    if users.size == 0:
+        return {"weeks": weeks, "cohorts": []}
+
+    # One entry per (user, active week), then each user's first week.
+    span = int(week.max() - week.min()) + 1
+    pairs = np.unique(users * span + (week - week.min()))
+    pair_users, pair_weeks = pairs // span, pairs % span + week.min()
+    first_week = np.full(len(view.dictionaries["users"]), np.iinfo(np.int64).max)
+    np.minimum.at(first_week, pair_users, pair_weeks)
+    cohort = first_week[pair_users]
+    offset = pair_weeks - cohort
+
+    # The most recent `cohorts` weeks in which anyone was first seen.
+    first_cohort = int(np.unique(cohort)[-cohorts:][0])
+    keep = (cohort >= first_cohort) & (offset <= weeks)
+    counts = np.bincount(
+        (cohort[keep] - first_cohort) * (weeks + 1) + offset[keep],
+        minlength=(int(week.max()) - first_cohort + 1) * (weeks + 1),
+    ).reshape(-1, weeks + 1)
+
+    current_week = int(_buckets(np.array([now_ms]), "week", tz_offset_minutes)[0]) if now_ms else int(week.max())
+    rows = []
+    for i, row in enumerate(counts.tolist()):
+        index = first_cohort + i
+        if row[0] == 0:
+            continue
+        elapsed = current_week - index
+        rows.append({
+            "week_start_ms": _bucket_start_ms(index, "week", tz_offset_minutes),
+            "size": row[0],
+            "active": [n if k <= elapsed else None for k, n in enumerate(row)],
+        })
+    return {"weeks": weeks, "cohorts": rows}
+
+
+REPORTS = {"accuracy": accuracy, "advice": advice, "retention": retention}
+
+
+def cached_report(name: str, **params) -> dict:
+    """
+    Runs a report over the current snapshot, memoised per snapshot generation
+    and parameters for ANALYTICS_CACHE_SECONDS.
+    """
+    cache = current_app.extensions.get("report_cache")
+    if cache is None:
+        cache = TTLCache(ttl=current_app.config["ANALYTICS_CACHE_SECONDS"])
+        current_app.extensions["report_cache"] = cache
+
+    if params.get("tz_offset_minutes") is None and name != "advice":
+        params["tz_offset_minutes"] = local_offset_minutes()
+    view = snapshot.current_view()
+    key = (name, view.generation, tuple(sorted(params.items())))
+    result = cache.get(key)
+    if result is None:
+        if name == "retention":
+            # refreshed_ms is when data last changed, which may be weeks ago on a quiet system.
+            params["now_ms"] = now_ms()
+        result = REPORTS[name](view, **params)
+        result["snapshot"] = {"generation": view.generation, "refreshed_ms": view.refreshed_ms, "rows": view.rows}
+        cache.set(key, result)
+    return result
@@ -1,6 +1,7 @@
 import csv
 import io
-import os
+import json
+import queue
 from collections import Counter
 from datetime import datetime, timedelta
 from io import BytesIO
@@ -8,19 +9,35 @@ from io import BytesIO
 import pandas as pd
 from flask import (
     Blueprint, render_template, request, redirect, url_for,
-    session, send_file, current_app, Response, flash
+    session, send_file, current_app, Response, flash, stream_with_context
 )
 from werkzeug.security import generate_password_hash
 
+from . import analytics, changefeed, events, presence, ratelimit, reports
 from .image_generator import build_image_url
 from .logger import log_event
-from .models.user import verify_credentials, ADMIN_USERNAME, refresh_users_cache, delete_user_data
+from .models.user import (
+    verify_credentials, ADMIN_USERNAME, set_admin_password_hash, delete_user_data,
+    bulk_create_users, bulk_delete_users, read_users_csv, read_usernames_csv
+)
 from .mood_detector import EMOTIONS, advice_for
-from .utils import get_db, login_required, admin_required
+from .settings import get_setting, set_setting
+from .storage import get_storage
+from .utils import (
+    get_db, login_required, admin_required, to_ms, from_ms, parse_filter_ms
+)
 
 bp = Blueprint("main", __name__)
 
 
+@bp.before_app_request
+def track_presence():
+    """Records a (throttled) presence heartbeat for the signed-in user."""
+    username = session.get("username")
+    if username:
+        presence.heartbeat(username)
+
+
 # ------------------------------
 # Dashboard Helper Functions
 # ------------------------------
@@ -31,7 +48,7 @@ def get_dashboard_stats():
     total_images = db.execute("SELECT COUNT(*) FROM feedback WHERE image_url IS NOT NULL").fetchone()[0] or 0
     total_feedback = db.execute("SELECT COUNT(*) FROM feedback").fetchone()[0] or 0
     try:
-        active_sessions = db.execute("SELECT COUNT(DISTINCT user) FROM logs WHERE timestamp > datetime('now', '-30 minutes')").fetchone()[0] or 0
+        active_sessions = presence.online_count(minutes=30)
     except Exception:
         active_sessions = 0
     return {'total_users': total_users, 'total_images': total_images, 'total_feedback': total_feedback, 'active_sessions': active_sessions}
@@ -43,13 +60,12 @@ def get_recent_activities():
     processed_activities = []
     try:
         activities = db.execute("""
-            SELECT username, created_at as date, 'Feedback submitted' as action, 'submitted' as status
-            FROM feedback WHERE username != 'admin' ORDER BY created_at DESC LIMIT 10
+            SELECT username, ts_ms as date, 'Feedback submitted' as action, 'submitted' as status
+            FROM feedback WHERE username != 'admin' ORDER BY ts_ms DESC LIMIT 10
         """).fetchall()
         for activity in activities:
             activity_dict = dict(activity)
-            if activity_dict.get('date'):
-                activity_dict['date'] = datetime.fromisoformat(activity_dict['date'])
+            activity_dict['date'] = from_ms(activity_dict.get('date'))
             processed_activities.append(activity_dict)
     except Exception as e:
         current_app.logger.error(f"Error fetching recent activities: {e}")
@@ -57,35 +73,21 @@ def get_recent_activities():
 
 
 def get_user_activities():
-    """Get user activity data, checking logs first and falling back to feedback."""
-    db = get_db()
+    """Get user activity data from the presence tracker."""
     processed_users = []
     try:
-        users = db.execute("""
-            SELECT user as username, MAX(timestamp) as last_login,
-                   CASE WHEN MAX(timestamp) > datetime('now', '-7 days') THEN 1 ELSE 0 END as active
-            FROM logs WHERE user != 'admin' AND event = 'login_success' GROUP BY user ORDER BY last_login DESC
-        """).fetchall()
-    except Exception:
-        # Fallback to feedback table if logs table fails or doesn't have the user
-        users = db.execute("""
-            SELECT username, MAX(created_at) as last_login,
-                   CASE WHEN MAX(created_at) > datetime('now', '-7 days') THEN 1 ELSE 0 END as active
-            FROM feedback WHERE username != 'admin' GROUP BY username ORDER BY last_login DESC
-        """).fetchall()
+        users = presence.all_users(exclude=ADMIN_USERNAME)
+        active = {user['username'] for user in presence.active_users(days=7, exclude=ADMIN_USERNAME)}
+    except Exception as e:
+        current_app.logger.error(f"Error fetching user activities: {e}")
+        users, active = [], set()
 
     for user in users:
-        user_dict = dict(user)
-        if user_dict.get('last_login'):
-            try:
-                user_dict['last_login'] = datetime.fromisoformat(user_dict['last_login'].replace('Z', '+00:00'))
-            except (ValueError, TypeError):
-                # Fallback for other common formats
-                try:
-                    user_dict['last_login'] = datetime.strptime(user_dict['last_login'], '%Y-%m-%d %H:%M:%S')
-                except (ValueError, TypeError):
-                    user_dict['last_login'] = None  # In case of parsing failure
-        processed_users.append(user_dict)
+        processed_users.append({
+            'username': user['username'],
+            'last_login': from_ms(user['last_login_ms']),
+            'active': 1 if user['username'] in active else 0,
+        })
     return processed_users
 
 
@@ -105,11 +107,13 @@ def entry():
 def login():
     """Handles user login."""
     if request.method == "POST":
-        username = request.form.get("username")
+        # Usernames are case-insensitive; keep one spelling so quotas, presence and data line up.
+        username = (request.form.get("username") or "").strip().lower()
         password = request.form.get("password") or request.form.get("password_select")
 
         if verify_credentials(username, password):
             session["username"] = username
+            presence.record_login(username)
             log_event("login_success", user=username)
             return redirect(url_for("main.home"))
         else:
@@ -139,35 +143,86 @@ def home():
 @login_required
 def generate():
     """Handles the AI art generation request."""
+    emotion, prompt = _generate_form()
+    username = session.get("username")
+
+    rejection = _admit_generation(emotion, username)
+    if rejection is not None:
+        return rejection
+
+    config = current_app.config
+    lease = ratelimit.acquire_slot(config["UPSTREAM_MAX_INFLIGHT"], config["UPSTREAM_LEASE_SECONDS"])
+    if lease is None:
+        return _upstream_busy(username)
+
+    log_event(
+        "generate",
+        user=username,
+        data={"emotion": emotion, "prompt": prompt}
+    )
+    # The slot is held until the last upstream call finishes, including a
+    # losing hedge that is still running after the winner has been returned.
+    image_url = build_image_url(prompt, emotion, on_settled=lambda: ratelimit.release_slot(lease))
+
+    return _render_result(prompt, emotion, image_url)
+
+
+# The helpers below are shared with the async serving mode (app/asgi.py).
+
+def _generate_form():
+    """Reads (emotion, prompt) from the generation form."""
     emotion = (request.form.get("emotion") or "").strip().lower()
     prompt = (request.form.get("prompt") or "").strip()
+    return emotion, prompt
+
 
+def _admit_generation(emotion, username):
+    """Validates the emotion and spends a quota token. Returns an error response, or None to proceed."""
     if emotion not in EMOTIONS:
         return render_template("_result_card.html", error=f"Invalid emotion: {emotion}")
 
-    log_event(
-        "generate",
-        user=session.get("username"),
-        data={"emotion": emotion, "prompt": prompt}
+    allowed, retry_after = ratelimit.take_token(
+        f"generate:{(username or '').strip().lower()}",
+        current_app.config["GENERATE_RATE_PER_MINUTE"],
+        current_app.config["GENERATE_BURST"],
     )
+    if not allowed:
+        log_event("generate_rate_limited", user=username, data={"retry_after": retry_after})
+        return _too_many_requests(f"You're generating images quickly. Please wait {retry_after}s and try again.", retry_after)
+    return None
 
-    image_url = build_image_url(prompt, emotion)
-    advice = advice_for(emotion)
 
+def _upstream_busy(username):
+    """Response for when every upstream slot is taken."""
+    log_event("generate_busy", user=username)
+    return _too_many_requests("The image service is busy right now. Please try again in a few seconds.", 5)
+
+
+def _render_result(prompt, emotion, image_url):
+    """Renders the result card for a generated image."""
     return render_template(
         "_result_card.html",
         image_url=image_url,
         prompt=prompt,
         emotion=emotion,
-        advice=advice
+        advice=advice_for(emotion)
     )
 
 
+def _too_many_requests(message, retry_after):
+    """Renders an error card as a 429 response with a Retry-After header."""
+    response = current_app.make_response(render_template("_result_card.html", error=message))
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
 @bp.route("/feedback", methods=["POST"])
 @login_required
 def feedback():
     """Handles user feedback submission."""
-    username = session.get("username")
+    username = (session.get("username") or "").strip().lower()
+    now = datetime.now()
     form_data = {
         "emotion": request.form.get("emotion"),
         "prompt": request.form.get("prompt"),
@@ -176,7 +231,8 @@ def feedback():
         "predicted_correct": int(request.form.get("predicted_correct", 0)),
         "advice_ok": int(request.form.get("advice_ok", 0)),
         "comments": request.form.get("comments", "").strip(),
-        "created_at": datetime.now().isoformat()
+        "created_at": now.isoformat(),
+        "ts_ms": to_ms(now),
     }
 
     log_event(
@@ -191,19 +247,29 @@ def feedback():
 
     try:
         db = get_db()
-        db.execute(
+        cursor = db.execute(
             """
             INSERT INTO feedback (username, emotion, prompt, image_url, advice,
-                                  predicted_correct, advice_ok, comments, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                  predicted_correct, advice_ok, comments, created_at, ts_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (username, *form_data.values())
         )
         db.commit()
+        first_from_user = db.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM feedback WHERE username = ? LIMIT 2)", (username,)
+        ).fetchone()[0] == 1
     except Exception as e:
         current_app.logger.error(f"DB insert failed: {e}")
         return "<p class='error'>Sorry, there was a problem saving your feedback.</p>"
 
+    events.publish("feedback", dict(form_data, id=cursor.lastrowid, username=username))
+    events.publish("stats", {
+        "total_feedback": 1,
+        "total_images": 1 if form_data["image_url"] is not None else 0,
+        "total_users": 1 if first_from_user and username != "admin" else 0,
+    })
+
     return "<p class='muted success'>Thank you for your feedback!</p>"
 
 
@@ -218,6 +284,7 @@ def admin_login():
         password = request.form.get("password")
         if verify_credentials(ADMIN_USERNAME, password):
             session["username"] = ADMIN_USERNAME
+            presence.record_login(ADMIN_USERNAME)
             log_event("admin_login_success", user=ADMIN_USERNAME)
             return redirect(url_for("main.admin_dashboard"))
         else:
@@ -248,13 +315,7 @@ def admin_reset():
             return render_template("admin_reset.html", error="Passwords do not match or are empty.")
 
         try:
-            project_root = os.path.abspath(os.path.join(current_app.root_path, ".."))
-            hash_file_path = os.path.join(project_root, "admin_pwd.hash")
-            new_hash = generate_password_hash(pw1)
-            with open(hash_file_path, "w", encoding="utf-8") as f:
-                f.write(new_hash)
-
-            refresh_users_cache()
+            set_admin_password_hash(generate_password_hash(pw1))
             log_event("admin_password_reset", user=ADMIN_USERNAME)
             return render_template("admin_reset.html", msg="Password has been reset successfully.")
         except Exception as e:
@@ -264,6 +325,35 @@ def admin_reset():
     return render_template("admin_reset.html")
 
 
+# ------------------------------
+# Health Checks
+# ------------------------------
+
+@bp.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@bp.route("/readyz")
+def readyz():
+    """
+    Readiness: the database and storage backend answer. The warm-up runs in
+    create_app(), before the app can serve anything, so it needs no check.
+    """
+    try:
+        get_db().execute("SELECT 1").fetchone()
+    except Exception as e:
+        current_app.logger.error(f"Readiness check failed: {e}")
+        return {"status": "database_unavailable"}, 503
+    try:
+        get_storage().kv_get("readyz")
+    except Exception as e:
+        current_app.logger.error(f"Readiness check failed: {e}")
+        return {"status": "storage_unavailable"}, 503
+    return {"status": "ready", "warmup_seconds": current_app.extensions.get("warmup", {}).get("seconds", 0.0)}
+
+
 # ------------------------------
 # Admin Pages
 # ------------------------------
@@ -280,13 +370,12 @@ def admin():
 def admin_feedback():
     """Displays all user feedback with charts and data."""
     db = get_db()
-    feedback_rows = db.execute("SELECT * FROM feedback ORDER BY created_at DESC").fetchall()
+    feedback_rows = db.execute("SELECT * FROM feedback ORDER BY ts_ms DESC").fetchall()
 
     feedback_data = []
     for row in feedback_rows:
         processed_row = dict(row)
-        if processed_row.get('created_at'):
-            processed_row['created_at'] = datetime.fromisoformat(processed_row['created_at'])
+        processed_row['created_at'] = from_ms(processed_row.get('ts_ms'))
         feedback_data.append(processed_row)
 
     # Chart data aggregation
@@ -295,7 +384,12 @@ def admin_feedback():
     mood_no = db.execute("SELECT COUNT(*) FROM feedback WHERE predicted_correct = 0").fetchone()[0] or 0
     advice_yes = db.execute("SELECT COUNT(*) FROM feedback WHERE advice_ok = 1").fetchone()[0] or 0
     advice_no = db.execute("SELECT COUNT(*) FROM feedback WHERE advice_ok = 0").fetchone()[0] or 0
-    daily_activity = db.execute("SELECT DATE(created_at) as date, COUNT(*) as count FROM feedback WHERE created_at >= date('now', '-7 days') GROUP BY DATE(created_at) ORDER BY date").fetchall()
+    week_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=6)
+    daily_activity = db.execute(
+        "SELECT DATE(ts_ms / 1000, 'unixepoch', 'localtime') as date, COUNT(*) as count "
+        "FROM feedback WHERE ts_ms >= ? GROUP BY date ORDER BY date",
+        (to_ms(week_start),)
+    ).fetchall()
 
     emotion_data = {'labels': [e['emotion'].capitalize() for e in emotion_counts], 'values': [e['count'] for e in emotion_counts]}
     rating_data = {'mood_yes': mood_yes, 'mood_no': mood_no, 'advice_yes': advice_yes, 'advice_no': advice_no}
@@ -332,6 +426,42 @@ def admin_dashboard():
     )
 
 
+@bp.route("/admin/stream")
+@admin_required
+def admin_stream():
+    """Server-sent event stream of new logs, feedback and counter deltas for the admin pages."""
+    subscription = events.broadcaster.subscribe()
+    if subscription is None:
+        return Response("Too many live admin connections.", status=503, headers={"Retry-After": "30"})
+    keepalive = current_app.config["ADMIN_STREAM_KEEPALIVE_SECONDS"]
+
+    @stream_with_context
+    def generate_events():
+        try:
+            # Ask the browser to wait a few seconds before reconnecting after a drop.
+            yield "retry: 5000\n\n"
+            # Until this page closes, every process relays its events (throttled to one write per keepalive).
+            events.mark_listening(keepalive)
+            yield events.format_sse("presence", {"active_sessions": presence.online_count(minutes=30)})
+            while True:
+                events.mark_listening(keepalive)
+                try:
+                    event_type, payload = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    # Idle: refresh the active-session count (an index range scan), which doubles as a keepalive.
+                    yield events.format_sse("presence", {"active_sessions": presence.online_count(minutes=30)})
+                    continue
+                yield events.format_sse(event_type, payload)
+        finally:
+            events.broadcaster.unsubscribe(subscription)
+
+    return Response(
+        generate_events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @bp.route("/admin/logs")
 @admin_required
 def admin_logs():
@@ -360,14 +490,16 @@ def admin_logs():
     if filter_source:
         query += " AND source LIKE ?"
         params.append(f"%{filter_source}%")
-    if filter_start:
-        query += " AND (timestamp >= ? OR created_at >= ?)"
-        params.extend([filter_start, filter_start])
-    if filter_end:
-        query += " AND (timestamp <= ? OR created_at <= ?)"
-        params.extend([filter_end, filter_end])
-
-    query += " ORDER BY COALESCE(created_at, timestamp) DESC LIMIT ?"
+    start_ms = parse_filter_ms(filter_start)
+    end_ms = parse_filter_ms(filter_end, end_of_day=True)
+    if start_ms is not None:
+        query += " AND ts_ms >= ?"
+        params.append(start_ms)
+    if end_ms is not None:
+        query += " AND ts_ms <= ?"
+        params.append(end_ms)
+
+    query += " ORDER BY ts_ms DESC LIMIT ?"
     params.append(limit_rows)
 
     db = get_db()
@@ -381,19 +513,73 @@ def admin_logs():
     )
 
 
+@bp.route("/admin/logs/analytics")
+@admin_required
+def admin_logs_analytics():
+    """JSON event counts per time bucket for the Logs page charts (see analytics.bucket_counts)."""
+    granularity = request.args.get("granularity", "day")
+    group_by = request.args.get("group_by", "event")
+    if granularity not in analytics.GRANULARITIES or group_by not in analytics.GROUP_COLUMNS:
+        return {"error": "granularity must be minute, hour or day; group_by must be event, user or source"}, 400
+    try:
+        points = min(max(int(request.args.get("points", 200)), 1), 2000)
+        top = min(max(int(request.args.get("top", 8)), 1), 50)
+        tz = request.args.get("tz")
+        limit = analytics.MAX_TZ_OFFSET_MINUTES
+        tz_offset = min(max(int(tz), -limit), limit) if tz not in (None, "") else None
+    except ValueError:
+        return {"error": "points, top and tz must be integers"}, 400
+
+    result = analytics.cached_bucket_counts(
+        start_ms=parse_filter_ms(request.args.get("start", "")),
+        end_ms=parse_filter_ms(request.args.get("end", ""), end_of_day=True),
+        granularity=granularity,
+        group_by=group_by,
+        points=points,
+        top=top,
+        tz_offset_minutes=tz_offset,
+        filters={k: request.args.get(k, "") for k in ("event", "user", "source")},
+    )
+    return result
+
+
+@bp.route("/admin/reports/<name>")
+@admin_required
+def admin_report(name):
+    """JSON feedback reports for the Feedback page: accuracy, advice or retention (see reports.py)."""
+    if name not in reports.REPORTS:
+        return {"error": "unknown report"}, 404
+    params = {}
+    try:
+        tz = request.args.get("tz")
+        if name != "advice":
+            limit = analytics.MAX_TZ_OFFSET_MINUTES
+            params["tz_offset_minutes"] = min(max(int(tz), -limit), limit) if tz not in (None, "") else None
+        if name == "retention":
+            params["weeks"] = min(max(int(request.args.get("weeks", 8)), 1), 52)
+            params["cohorts"] = min(max(int(request.args.get("cohorts", 12)), 1), 104)
+    except ValueError:
+        return {"error": "tz, weeks and cohorts must be integers"}, 400
+    if name == "accuracy":
+        params["granularity"] = request.args.get("granularity", "week")
+        if params["granularity"] not in reports.STEPS:
+            return {"error": "granularity must be day or week"}, 400
+    return reports.cached_report(name, **params)
+
+
 @bp.route("/admin/user/<username>")
 @admin_required
 def admin_view_user(username):
     """Displays a detailed view of a single user's activity."""
     db = get_db()
-    feedback = db.execute("SELECT * FROM feedback WHERE username = ? ORDER BY created_at DESC", (username,)).fetchall()
-    logs = db.execute("SELECT * FROM logs WHERE user = ? ORDER BY timestamp DESC", (username,)).fetchall()
-    last_login_row = db.execute("SELECT MAX(timestamp) as last_login FROM logs WHERE user = ? AND event = 'login_success'", (username,)).fetchone()
-    last_login = datetime.fromisoformat(last_login_row['last_login']) if last_login_row and last_login_row['last_login'] else None
+    feedback = db.execute("SELECT * FROM feedback WHERE username = ? ORDER BY ts_ms DESC", (username,)).fetchall()
+    logs = db.execute("SELECT * FROM logs WHERE user = ? ORDER BY ts_ms DESC", (username,)).fetchall()
+    last_login_row = db.execute("SELECT MAX(ts_ms) as last_login FROM logs WHERE user = ? AND event = 'login_success'", (username,)).fetchone()
+    last_login = from_ms(last_login_row['last_login']) if last_login_row else None
 
-    # Process rows to convert date strings into datetime objects for the template
-    processed_feedback = [dict(row, created_at=datetime.fromisoformat(row['created_at'])) for row in feedback]
-    processed_logs = [dict(row, timestamp=datetime.fromisoformat(row['timestamp'])) for row in logs]
+    # Process rows to convert epoch timestamps into datetime objects for the template
+    processed_feedback = [dict(row, created_at=from_ms(row['ts_ms'])) for row in feedback]
+    processed_logs = [dict(row, timestamp=from_ms(row['ts_ms'])) for row in logs]
 
     user_data = {
         "username": username,
@@ -412,6 +598,7 @@ def admin_delete_user(username):
     """Deletes a user and all their associated data."""
     db = get_db()
     if delete_user_data(username, db):
+        presence.forget([username])
         log_event("user_deleted", user=session.get("username"), data={"deleted_user": username})
         flash(f"User '{username}' and all their data have been successfully deleted.", "success")
     else:
@@ -419,19 +606,81 @@ def admin_delete_user(username):
     return redirect(url_for("main.admin_dashboard"))
 
 
-def get_setting(key):
-    """Fetches a setting value from the database."""
-    db = get_db()
-    row = db.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
-    return row['value'] if row else None
+@bp.route("/admin/users/import", methods=["POST"])
+@admin_required
+def admin_import_users():
+    """Creates users in bulk from an uploaded CSV of username,password rows."""
+    upload = request.files.get("users_csv")
+    if not upload or not upload.filename:
+        flash("Choose a CSV file of username,password rows to import.", "error")
+        return redirect(url_for("main.admin_dashboard"))
 
+    try:
+        rows = read_users_csv(upload.read().decode("utf-8-sig"))
+    except (UnicodeDecodeError, csv.Error) as e:
+        flash(f"Could not read the CSV file: {e}", "error")
+        return redirect(url_for("main.admin_dashboard"))
+
+    result = bulk_create_users(
+        rows,
+        overwrite=bool(request.form.get("overwrite")),
+        workers=current_app.config["PASSWORD_HASH_WORKERS"] or None,
+    )
+    log_event("users_imported", user=session.get("username"), data={
+        "created": len(result["created"]),
+        "updated": len(result["updated"]),
+        "skipped": len(result["skipped"]),
+    })
+    message = f"Imported users: {len(result['created'])} created, {len(result['updated'])} updated, {len(result['skipped'])} skipped."
+    if result["skipped"]:
+        message += " Skipped: " + ", ".join(f"{name or '(blank)'} ({reason})" for name, reason in result["skipped"][:10])
+        if len(result["skipped"]) > 10:
+            message += ", ..."
+    flash(message, "success" if result["created"] or result["updated"] else "error")
+    return redirect(url_for("main.admin_dashboard"))
 
-def set_setting(key, value):
-    """Saves a setting value to the database."""
-    db = get_db()
-    # Use INSERT OR REPLACE to either create or update the setting
-    db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-    db.commit()
+
+@bp.route("/admin/users/delete", methods=["POST"])
+@admin_required
+def admin_bulk_delete_users():
+    """Deletes the selected users (and/or those listed in an uploaded CSV) and all their data."""
+    usernames = request.form.getlist("usernames")
+    upload = request.files.get("usernames_csv")
+    if upload and upload.filename:
+        try:
+            usernames += read_usernames_csv(upload.read().decode("utf-8-sig"))
+        except (UnicodeDecodeError, csv.Error) as e:
+            flash(f"Could not read the CSV file: {e}", "error")
+            return redirect(url_for("main.admin_dashboard"))
+
+    deleted = bulk_delete_users(usernames, get_db())
+    if deleted is None:
+        flash("Failed to delete the selected users. No data was changed.", "error")
+    elif not deleted:
+        flash("No users selected for deletion. Admins cannot be deleted.", "error")
+    else:
+        presence.forget(deleted)
+        log_event("users_deleted", user=session.get("username"), data={"deleted_users": deleted})
+        flash(f"Deleted {len(deleted)} user(s) and all their data.", "success")
+    return redirect(url_for("main.admin_dashboard"))
+
+
+@bp.route("/admin/usage")
+@admin_required
+def admin_usage():
+    """Shows current /generate quota usage and in-flight upstream calls."""
+    config = current_app.config
+    usage = ratelimit.usage_snapshot(config["GENERATE_RATE_PER_MINUTE"], config["GENERATE_BURST"])
+    buckets = [dict(b, updated=from_ms(b["updated_ms"])) for b in usage["buckets"]]
+    leases = [dict(l, acquired=from_ms(l["acquired_ms"])) for l in usage["leases"]]
+    return render_template(
+        "admin_usage.html",
+        buckets=buckets,
+        leases=leases,
+        rate_per_minute=config["GENERATE_RATE_PER_MINUTE"],
+        burst=config["GENERATE_BURST"],
+        max_inflight=config["UPSTREAM_MAX_INFLIGHT"],
+    )
 
 
 @bp.route("/admin/settings", methods=["GET", "POST"])
@@ -458,6 +707,32 @@ def admin_settings():
 # Export Routes
 # ------------------------------
 
+@bp.route("/admin/export/changes", methods=["GET"])
+@admin_required
+def export_changes():
+    """Streams logs/feedback rows added or deleted since `cursor` as NDJSON (see changefeed.iter_changes)."""
+    try:
+        positions = changefeed.decode_cursor(request.args.get("cursor"))
+        limit = min(max(int(request.args.get("limit", 5000)), 1), 50000)
+    except ValueError as e:
+        return {"error": f"invalid cursor or limit: {e}"}, 400
+
+    @stream_with_context
+    def generate_lines():
+        db = get_db()
+        try:
+            for change in changefeed.iter_changes(db, positions, limit):
+                yield json.dumps(change, separators=(",", ":")) + "\n"
+        finally:
+            db.close()
+
+    return Response(
+        generate_lines(),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
 @bp.route('/admin/export/<export_format>', methods=["GET"])
 @admin_required
 def export_data(export_format):
@@ -0,0 +1,51 @@
+import threading
+import time
+from flask import current_app
+from .storage import get_storage
+
+# Settings live in the shared key-value store under "setting:<key>" (the
+# local backend seeds these from the old `settings` table). Each process
+# keeps the full set in memory: loaded at warm-up, dropped whenever any
+# process saves a setting (via the "settings" channel), and re-read after
+# SETTINGS_CACHE_SECONDS as a backstop in case a message was missed.
+_PREFIX = "setting:"
+_CACHE: dict[str, str] = {}
+_LOADED_AT: float | None = None
+_LOCK = threading.Lock()
+
+
+def load_settings() -> dict[str, str]:
+    """(Re)loads every setting from the store into the cache."""
+    global _LOADED_AT
+    values = {key[len(_PREFIX):]: value for key, value in get_storage().kv_scan(_PREFIX).items()}
+    with _LOCK:
+        _CACHE.clear()
+        _CACHE.update(values)
+        _LOADED_AT = time.monotonic()
+        return dict(_CACHE)
+
+
+def invalidate_settings() -> None:
+    """Marks the cache stale; the next read reloads it."""
+    global _LOADED_AT
+    with _LOCK:
+        _LOADED_AT = None
+
+
+def get_setting(key):
+    """Fetches a setting value, from the cache when it is fresh enough."""
+    max_age = current_app.config.get("SETTINGS_CACHE_SECONDS", 30)
+    with _LOCK:
+        fresh = _LOADED_AT is not None and time.monotonic() - _LOADED_AT < max_age
+        if fresh:
+            return _CACHE.get(key)
+    return load_settings().get(key)
+
+
+def set_setting(key, value):
+    """Saves a setting value and tells every process to reload its settings."""
+    storage = get_storage()
+    storage.kv_set(_PREFIX + key, value)
+    with _LOCK:
+        _CACHE[key] = value
+    storage.publish("settings", {"key": key})
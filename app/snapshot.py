@@ -0,0 +1,307 @@
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from flask import current_app
+from . import changefeed
+from .storage import LockTimeout, get_storage
+from .utils import get_db
+
+# Column-oriented copy of the feedback and logs tables for the admin reports
+# (app/reports.py). Each column is a flat binary file of fixed-width values
+# that readers memory-map as a NumPy array, so every worker shares one copy
+# through the page cache and a report reads only the columns it needs.
+#
+# The snapshot is kept up to date from the change feed (app/changefeed.py):
+# new rows are appended to the column files and tombstoned rows are marked
+# dead in the `alive` column, so a refresh costs as much as the rows that
+# changed since the last one. Text columns are dictionary-encoded: the file
+# holds an int32 code into a list kept in meta.json, with -1 for NULL.
+#
+# meta.json is written last, atomically, and holds the row counts and the
+# change-feed cursor. Bytes past a column's recorded row count (left by an
+# interrupted refresh) are ignored by readers and trimmed by the next refresh.
+# A full rebuild writes into a new columns-<build> directory rather than
+# truncating files that other processes may still have mapped. User purges
+# also trigger a rebuild, so deleted usernames leave the dictionaries.
+
+FORMAT_VERSION = 1
+# Rows per change-feed pull while refreshing.
+REFRESH_BATCH = 20000
+NULL = -1
+
+# {table: [(column, dtype, dictionary or None)]}; "id" must come first.
+COLUMNS = {
+    "feedback": [
+        ("id", "<i8", None),
+        ("ts_ms", "<i8", None),
+        ("user", "<i4", "users"),
+        ("emotion", "<i4", "emotions"),
+        ("advice", "<i4", "advice"),
+        ("predicted_correct", "<i1", None),
+        ("advice_ok", "<i1", None),
+        ("alive", "<u1", None),
+    ],
+    "logs": [
+        ("id", "<i8", None),
+        ("ts_ms", "<i8", None),
+        ("user", "<i4", "users"),
+        ("event", "<i4", "events"),
+        ("alive", "<u1", None),
+    ],
+}
+DICTIONARIES = ("users", "emotions", "advice", "events")
+
+
+def _source_value(table: str, column: str, row: dict):
+    """The value for a snapshot column from a change-feed row (usernames are matched case-insensitively)."""
+    if column == "alive":
+        return 1
+    if column == "user":
+        name = row.get("username" if table == "feedback" else "user")
+        return name.strip().lower() if name and name.strip() else None
+    return row.get(column)
+
+
+class SnapshotView:
+    """A read-only, memory-mapped view of one snapshot generation."""
+
+    def __init__(self, directory: str, meta: dict):
+        directory = _columns_dir(directory, meta)
+        self.generation = meta["generation"]
+        self.refreshed_ms = meta["refreshed_ms"]
+        self.rows = dict(meta["rows"])
+        self.dictionaries = {name: list(values) for name, values in meta["dictionaries"].items()}
+        self.tables = {
+            table: {column: _map_column(directory, table, column, dtype, self.rows[table], "r")
+                    for column, dtype, _ in columns}
+            for table, columns in COLUMNS.items()
+        }
+
+    def code(self, dictionary: str, value: str) -> int:
+        """The code for `value` in a dictionary, or NULL if it never occurs."""
+        try:
+            return self.dictionaries[dictionary].index(value)
+        except ValueError:
+            return NULL
+
+
+def _columns_dir(directory: str, meta: dict) -> str:
+    return os.path.join(directory, f"columns-{meta['build']}")
+
+
+def _column_path(directory: str, table: str, column: str) -> str:
+    return os.path.join(directory, f"{table}.{column}.bin")
+
+
+def _map_column(directory, table, column, dtype, rows, mode) -> np.ndarray:
+    if rows == 0:
+        # mmap can't map an empty file.
+        return np.empty(0, dtype=dtype)
+    return np.memmap(_column_path(directory, table, column), dtype=dtype, mode=mode, shape=(rows,))
+
+
+def _empty_meta() -> dict:
+    return {
+        "version": FORMAT_VERSION,
+        "generation": 0,
+        "build": 0,
+        "refreshed_ms": None,
+        "rows": {table: 0 for table in COLUMNS},
+        "cursor": changefeed.encode_cursor({}),
+        "dictionaries": {name: [] for name in DICTIONARIES},
+    }
+
+
+def snapshot_dir() -> str:
+    return current_app.config["SNAPSHOT_DIR"]
+
+
+def _read_meta(directory: str) -> dict | None:
+    try:
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return meta if meta.get("version") == FORMAT_VERSION else None
+
+
+def _write_meta(directory: str, meta: dict) -> None:
+    path = os.path.join(directory, "meta.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _source_was_reset(db, meta: dict) -> bool:
+    """
+    True if the database no longer has the rows the snapshot was built from
+    (e.g. it was replaced). AUTOINCREMENT ids are never reused, so the
+    highest id ever handed out (sqlite_sequence) only falls behind the
+    cursor in a different database; MAX(id) would, whenever the newest rows
+    are purged.
+    """
+    positions = changefeed.decode_cursor(meta["cursor"])
+    for stream in changefeed.STREAMS:
+        row = db.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (stream,)).fetchone()
+        if (row[0] if row else 0) < positions[stream]:
+            return True
+    return False
+
+
+def _has_new_purges(db, meta: dict) -> bool:
+    """True if user rows were purged (tombstoned) since the snapshot's cursor."""
+    position = changefeed.decode_cursor(meta["cursor"])["tombstones"]
+    return db.execute("SELECT 1 FROM tombstones WHERE id > ? LIMIT 1", (position,)).fetchone() is not None
+
+
+def _append_rows(directory: str, meta: dict, table: str, rows: list[dict]) -> None:
+    """Encodes rows column by column and appends them to the column files."""
+    lookups = {name: {value: code for code, value in enumerate(values)}
+               for name, values in meta["dictionaries"].items()}
+    for column, dtype, dictionary in COLUMNS[table]:
+        values = [_source_value(table, column, row) for row in rows]
+        if dictionary is not None:
+            lookup, names = lookups[dictionary], meta["dictionaries"][dictionary]
+            encoded = []
+            for value in values:
+                if value is None:
+                    encoded.append(NULL)
+                    continue
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(names)
+                    names.append(value)
+                encoded.append(code)
+            values = encoded
+        else:
+            values = [NULL if value is None else value for value in values]
+        with open(_column_path(directory, table, column), "ab") as f:
+            f.write(np.asarray(values, dtype=dtype).tobytes())
+    meta["rows"][table] += len(rows)
+
+
+def _apply_deletes(directory: str, meta: dict, table: str, row_ids: list[int]) -> None:
+    """Marks tombstoned rows dead. Ids are sorted, so each row is found by binary search."""
+    rows = meta["rows"][table]
+    if not row_ids or rows == 0:
+        return
+    ids = _map_column(directory, table, "id", "<i8", rows, "r")
+    alive = _map_column(directory, table, "alive", "<u1", rows, "r+")
+    targets = np.asarray(row_ids, dtype="<i8")
+    positions = np.searchsorted(ids, targets)
+    found = positions < rows
+    found[found] = ids[positions[found]] == targets[found]
+    alive[positions[found]] = 0
+    alive.flush()
+
+
+def _remove_old_builds(directory: str, meta: dict) -> None:
+    """Deletes earlier builds' column files (processes still mapping them keep their copy until they remap)."""
+    current = os.path.basename(_columns_dir(directory, meta))
+    for name in os.listdir(directory):
+        if name.startswith("columns-") and name != current:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def refresh(full: bool = False) -> dict:
+    """
+    Brings the snapshot up to date with the database and returns its meta.
+    Only rows past the stored cursor are read; `full` (or a database that no
+    longer matches the snapshot) rebuilds it from scratch. The generation
+    (and meta.json) only changes when rows were added or deleted. Runs under
+    a storage lock so only one process writes the files at a time.
+    """
+    directory = snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    db = get_db()
+    try:
+        with get_storage().lock("analytics-snapshot", ttl=300, timeout=60):
+            meta = None if full else _read_meta(directory)
+            # Dictionaries only grow, so a purged user's name would stay in meta.json for
+            # good: after a purge the snapshot is rebuilt from the rows that are left.
+            rebuild = meta is None or _source_was_reset(db, meta) or _has_new_purges(db, meta)
+            if rebuild:
+                previous = meta or _read_meta(directory)
+                meta = _empty_meta()
+                # Numbered past the previous build so views of it stay valid.
+                meta["generation"] = previous["generation"] if previous else 0
+                meta["build"] = meta["generation"] + 1
+            columns_dir = _columns_dir(directory, meta)
+            os.makedirs(columns_dir, exist_ok=True)
+            # Drop anything an interrupted refresh appended past the recorded row counts.
+            for table, columns in COLUMNS.items():
+                for column, dtype, _ in columns:
+                    path = _column_path(columns_dir, table, column)
+                    size = meta["rows"][table] * np.dtype(dtype).itemsize
+                    with open(path, "ab") as f:
+                        f.truncate(size)
+
+            positions = changefeed.decode_cursor(meta["cursor"])
+            # A new build is written even if it is empty; otherwise only if rows changed.
+            changed = rebuild
+            while True:
+                inserts = {table: [] for table in COLUMNS}
+                deletes = {table: [] for table in COLUMNS}
+                tail = None
+                for change in changefeed.iter_changes(db, positions, REFRESH_BATCH):
+                    if "cursor" in change:
+                        tail = change
+                    elif change["op"] == "upsert":
+                        inserts[change["table"]].append(change["row"])
+                    elif change["table"] in deletes:
+                        deletes[change["table"]].append(change["id"])
+                for table in COLUMNS:
+                    if inserts[table]:
+                        _append_rows(columns_dir, meta, table, inserts[table])
+                    _apply_deletes(columns_dir, meta, table, sorted(deletes[table]))
+                changed = changed or any(inserts.values()) or any(deletes.values())
+                meta["cursor"] = tail["cursor"]
+                positions = changefeed.decode_cursor(tail["cursor"])
+                if not tail["more"]:
+                    break
+
+            if not changed:
+                # Same generation, so every process keeps its mapped view and cached reports.
+                return meta
+            meta["generation"] += 1
+            meta["refreshed_ms"] = int(time.time() * 1000)
+            _write_meta(directory, meta)
+            _remove_old_builds(directory, meta)
+            return meta
+    finally:
+        db.close()
+
+
+# Per-process view of the newest generation, remapped when it changes.
+_VIEW: SnapshotView | None = None
+_CHECKED_AT: float | None = None
+_LOCK = threading.Lock()
+
+
+def current_view() -> SnapshotView:
+    """
+    The current snapshot, refreshed first if this process hasn't checked for
+    changes in SNAPSHOT_REFRESH_SECONDS. If another process holds the refresh
+    lock for too long, the last snapshot on disk is used as is.
+    """
+    global _VIEW, _CHECKED_AT
+    directory = snapshot_dir()
+    with _LOCK:
+        stale = _CHECKED_AT is None or time.monotonic() - _CHECKED_AT >= current_app.config["SNAPSHOT_REFRESH_SECONDS"]
+        if stale:
+            try:
+                meta = refresh()
+            except LockTimeout:
+                meta = _read_meta(directory)
+            _CHECKED_AT = time.monotonic()
+        else:
+            meta = _read_meta(directory)
+        if meta is None:
+            meta = refresh()
+        if _VIEW is None or _VIEW.generation != meta["generation"]:
+            _VIEW = SnapshotView(directory, meta)
+        return _VIEW
@@ -0,0 +1,61 @@
+import os
+from flask import current_app
+
+from .base import StorageBackend, LockTimeout
+from .local import LocalBackend
+
+# Shared state and coordination (see base.StorageBackend). STORAGE_BACKEND
+# picks the implementation:
+#   local  - SQLite tables and files on this host (default)
+#   redis  - a Redis-protocol server shared by every host
+
+# Blob buckets, and where the local backend keeps them.
+CREDENTIALS = "credentials"  # users.json and admin_pwd.hash, relative to the project root
+IMAGES = "images"            # generated images, keyed by prompt hash
+
+__all__ = [
+    "StorageBackend", "LockTimeout", "LocalBackend", "CREDENTIALS", "IMAGES",
+    "create_backend", "get_storage", "init_app",
+]
+
+
+def create_backend(app, kind: str | None = None) -> StorageBackend:
+    """Builds the backend named by `kind` (default: STORAGE_BACKEND)."""
+    kind = kind or app.config["STORAGE_BACKEND"]
+    if kind == "local":
+        project_root = os.path.abspath(os.path.join(app.root_path, ".."))
+        return LocalBackend(
+            app.config["DATABASE_PATH"],
+            blob_dirs={
+                CREDENTIALS: project_root,
+                IMAGES: os.path.join(app.root_path, "cache_images"),
+            },
+            poll_interval=app.config["PUBSUB_POLL_SECONDS"],
+            logger=app.logger,
+        )
+    if kind == "redis":
+        from .redis_backend import RedisBackend
+        return RedisBackend(app.config["REDIS_URL"], prefix=app.config["STORAGE_PREFIX"], logger=app.logger)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{kind}' (expected 'local' or 'redis')")
+
+
+def get_storage() -> StorageBackend:
+    return current_app.extensions["storage"]
+
+
+def init_app(app) -> None:
+    """Creates the backend and subscribes the per-process caches to their invalidation channels."""
+    from .. import events, settings
+    from ..models import user
+
+    backend = create_backend(app)
+    app.extensions["storage"] = backend
+
+    backend.subscribe("users", lambda message: user.invalidate_users_cache())
+    backend.subscribe("settings", lambda message: settings.invalidate_settings())
+    # Admin pages connected to another worker (or host) still get this one's live events.
+    backend.subscribe("events", events.deliver)
+
+    @app.before_request
+    def start_storage_listener():
+        backend.ensure_listener()
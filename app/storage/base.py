@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+
+
+class LockTimeout(Exception):
+    """Raised when a named lock could not be acquired in time."""
+
+
+class StorageBackend:
+    """
+    Shared state for everything that must agree across workers (and, with a
+    networked backend, across hosts):
+
+    - key-value: small string values, optionally expiring;
+    - blobs: files grouped into buckets (credentials, generated images);
+    - locks: named, expiring mutual exclusion for read-modify-write updates;
+    - rate limits: token buckets and counted, expiring slots, each updated atomically;
+    - pub/sub: fire-and-forget messages, mainly "this cache is stale".
+
+    Subclasses implement the storage primitives and `_send`/`_listen` for
+    pub/sub; dispatching messages to handlers is shared here.
+
+    A backend created before gunicorn forks its workers (preload_app) is
+    shared by all of them, so per-process state (origin, listener) is reset
+    in each child after the fork.
+    """
+    name = "base"
+    # True when several hosts can share this backend (events are relayed through it).
+    distributed = False
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        # Identifies this process, so it can skip its own messages coming back from the store.
+        self.origin = uuid.uuid4().hex
+        self._pid = os.getpid()
+        self._handlers: dict[str, list] = {}
+        self._listener_pid: int | None = None
+        self._listener_lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # Weak, so the fork hook doesn't keep discarded backends (e.g. from tests) alive.
+            ref = weakref.WeakMethod(self._after_fork)
+            os.register_at_fork(after_in_child=lambda: ref() and ref()())
+
+    def _after_fork(self) -> None:
+        """Gives a forked child its own origin; otherwise it would drop its siblings' messages as its own."""
+        self._pid = os.getpid()
+        self.origin = uuid.uuid4().hex
+        self._listener_pid = None
+        # The parent's lock may have been held by a thread that doesn't exist here.
+        self._listener_lock = threading.Lock()
+
+    def _check_pid(self) -> None:
+        if self._pid != os.getpid():
+            self._after_fork()
+
+    # --- Key-value ---
+
+    def kv_get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    def kv_set(self, key: str, value: str, ttl: float | None = None) -> None:
+        raise NotImplementedError
+
+    def kv_delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def kv_scan(self, prefix: str) -> dict[str, str]:
+        """All live keys starting with `prefix`, with their values."""
+        raise NotImplementedError
+
+    # --- Blobs ---
+
+    def blob_get(self, bucket: str, name: str) -> bytes | None:
+        raise NotImplementedError
+
+    def blob_put(self, bucket: str, name: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def blob_delete(self, bucket: str, name: str) -> None:
+        raise NotImplementedError
+
+    # --- Locks ---
+
+    def _try_acquire(self, name: str, token: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def _release(self, name: str, token: str) -> None:
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self, name: str, ttl: float = 30, timeout: float = 10):
+        """
+        Holds the named lock for the duration of the block. The lock expires
+        after `ttl` seconds so a crashed holder cannot block others forever.
+        Raises LockTimeout if it cannot be acquired within `timeout` seconds.
+        """
+        token = uuid.uuid4().hex
+        give_up_at = time.monotonic() + timeout
+        delay = 0.01
+        while not self._try_acquire(name, token, ttl):
+            if time.monotonic() >= give_up_at:
+                raise LockTimeout(f"Could not acquire lock '{name}' within {timeout}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+        try:
+            yield
+        finally:
+            self._release(name, token)
+
+    # --- Rate limits ---
+
+    def bucket_take(self, key: str, rate_per_minute: float, burst: int) -> tuple[bool, float]:
+        """
+        Takes one token from the bucket `key`, which holds at most `burst`
+        tokens and refills continuously at `rate_per_minute`. Returns
+        (allowed, tokens): the level after refilling, before any was taken.
+        """
+        raise NotImplementedError
+
+    def bucket_levels(self) -> list[dict]:
+        """Every bucket as last written (key, tokens, updated_ms), most recently used first."""
+        raise NotImplementedError
+
+    def slot_acquire(self, name: str, capacity: int, ttl: float, owner: str) -> str | None:
+        """
+        Claims one of `capacity` slots named `name`. Returns a slot id, or
+        None if all are taken. A slot expires after `ttl` seconds so a
+        crashed holder cannot keep it forever.
+        """
+        raise NotImplementedError
+
+    def slot_release(self, name: str, slot_id: str) -> None:
+        raise NotImplementedError
+
+    def slot_list(self, name: str) -> list[dict]:
+        """Slots currently held (id, owner, acquired_ms, expires_ms), oldest first."""
+        raise NotImplementedError
+
+    # --- Pub/sub ---
+
+    def subscribe(self, channel: str, handler) -> None:
+        """Calls `handler(message)` for every message published on `channel`, by any process."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel: str, message: dict | None = None) -> None:
+        """Delivers a message to this process's handlers at once, and to every other process via the store."""
+        message = message or {}
+        self._check_pid()
+        self._dispatch(channel, message)
+        try:
+            self._send(channel, json.dumps({"origin": self.origin, "message": message}, default=str))
+        except Exception as e:
+            self._log_error(f"Could not publish on '{channel}': {e}")
+
+    def ensure_listener(self) -> None:
+        """
+        Starts the background listener for this process if it isn't running.
+        Cheap to call on every request; it also restarts the listener in
+        workers forked from a preloaded master, where threads don't survive.
+        """
+        self._check_pid()
+        pid = os.getpid()
+        if self._listener_pid == pid or not self._handlers:
+            return
+        with self._listener_lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+            thread = threading.Thread(target=self._listen_forever, name=f"{self.name}-pubsub", daemon=True)
+            thread.start()
+
+    def _listen_forever(self) -> None:
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                self._log_error(f"Pub/sub listener stopped, restarting: {e}")
+                time.sleep(1)
+
+    def _on_raw_message(self, channel: str, raw: str | bytes) -> None:
+        try:
+            envelope = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        if envelope.get("origin") != self.origin:
+            self._dispatch(channel, envelope.get("message") or {})
+
+    def _resync(self) -> None:
+        """
+        Called by `_listen` when messages may have been missed (before this
+        process subscribed, or across a gap): every handler gets a message
+        marked "resync", so caches reload from the store.
+        """
+        for channel in list(self._handlers):
+            self._dispatch(channel, {"resync": True})
+
+    def _dispatch(self, channel: str, message: dict) -> None:
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(message)
+            except Exception as e:
+                self._log_error(f"Handler for '{channel}' failed: {e}")
+
+    def _send(self, channel: str, raw: str) -> None:
+        raise NotImplementedError
+
+    def _listen(self) -> None:
+        """Blocks, passing incoming messages to `_on_raw_message`."""
+        raise NotImplementedError
+
+    def _log_error(self, message: str) -> None:
+        if self.logger is not None:
+            self.logger.error(message)
+
+    def close(self) -> None:
+        pass
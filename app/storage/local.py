@@ -0,0 +1,264 @@
+import os
+import sqlite3
+import time
+from .base import StorageBackend
+
+# Default backend for a single host: key-value, locks, rate limits and pub/sub
+# messages live in the app's SQLite database (so every worker on the host shares them),
+# and blobs are plain files. The tables are created by app/migrations.py.
+
+# Pub/sub messages are only kept long enough for every worker's poller to see them.
+MESSAGE_RETENTION_MS = 60 * 1000
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class LocalBackend(StorageBackend):
+    name = "local"
+    distributed = False
+
+    def __init__(self, db_path: str, blob_dirs: dict[str, str], poll_interval: float = 1.0, logger=None):
+        super().__init__(logger=logger)
+        self.db_path = db_path
+        self.blob_dirs = blob_dirs
+        self.poll_interval = poll_interval
+        # Last pub/sub message handled. Recorded now, before the app warms its caches and
+        # workers fork, so a listener that starts later catches up on everything since.
+        self._position = self._latest_message_id()
+
+    def _latest_message_id(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM pubsub_messages").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Not get_db(): the pub/sub poller runs outside any app context.
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    # --- Key-value ---
+
+    def kv_get(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT value FROM kv_store WHERE key = ? AND (expires_ms IS NULL OR expires_ms > ?)",
+                (key, _now_ms())
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def kv_set(self, key, value, ttl=None):
+        expires_ms = _now_ms() + int(ttl * 1000) if ttl else None
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv_store (key, value, expires_ms) VALUES (?, ?, ?)",
+                (key, value, expires_ms)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def kv_delete(self, key):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM kv_store WHERE key = ?", (key,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def kv_scan(self, prefix):
+        conn = self._connect()
+        try:
+            # A range on the primary key rather than LIKE, so '%' and '_' in prefixes are literal.
+            rows = conn.execute(
+                "SELECT key, value FROM kv_store WHERE key >= ? AND key < ? AND (expires_ms IS NULL OR expires_ms > ?)",
+                (prefix, prefix + "\uffff", _now_ms())
+            ).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    # --- Blobs ---
+
+    def _blob_path(self, bucket: str, name: str) -> str:
+        root = os.path.abspath(self.blob_dirs[bucket])
+        path = os.path.abspath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Blob name '{name}' escapes bucket '{bucket}'")
+        return path
+
+    def blob_get(self, bucket, name):
+        try:
+            with open(self._blob_path(bucket, name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def blob_put(self, bucket, name, data):
+        path = self._blob_path(bucket, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename, so readers never see a half-written file.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def blob_delete(self, bucket, name):
+        try:
+            os.remove(self._blob_path(bucket, name))
+        except FileNotFoundError:
+            pass
+
+    # --- Locks ---
+
+    def _try_acquire(self, name, token, ttl):
+        now = _now_ms()
+        conn = self._connect()
+        try:
+            # Takes the lock if it is free or its holder's lease has expired, in one statement.
+            cursor = conn.execute(
+                """
+                INSERT INTO storage_locks (name, owner, expires_ms) VALUES (:name, :owner, :expires)
+                ON CONFLICT(name) DO UPDATE SET owner = :owner, expires_ms = :expires
+                WHERE storage_locks.expires_ms < :now
+                """,
+                {"name": name, "owner": token, "expires": now + int(ttl * 1000), "now": now}
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def _release(self, name, token):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM storage_locks WHERE name = ? AND owner = ?", (name, token))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- Rate limits ---
+
+    def bucket_take(self, key, rate_per_minute, burst):
+        now = _now_ms()
+        rate_per_ms = rate_per_minute / 60000.0
+        conn = self._connect()
+        try:
+            # A single upsert refills and spends atomically; the WHERE clause leaves
+            # the row untouched (and returns nothing) when less than one token is left.
+            row = conn.execute(
+                """
+                INSERT INTO storage_buckets (key, tokens, updated_ms) VALUES (:key, :burst - 1, :now)
+                ON CONFLICT(key) DO UPDATE SET
+                    tokens = MIN(:burst, tokens + (:now - updated_ms) * :rate) - 1,
+                    updated_ms = :now
+                WHERE MIN(:burst, tokens + (:now - updated_ms) * :rate) >= 1
+                RETURNING tokens
+                """,
+                {"key": key, "burst": burst, "now": now, "rate": rate_per_ms}
+            ).fetchone()
+            conn.commit()
+            if row is not None:
+                return True, row[0] + 1
+            current = conn.execute("SELECT tokens, updated_ms FROM storage_buckets WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        tokens = min(burst, current[0] + (now - current[1]) * rate_per_ms) if current else 0
+        return False, tokens
+
+    def bucket_levels(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT key, tokens, updated_ms FROM storage_buckets ORDER BY updated_ms DESC").fetchall()
+        finally:
+            conn.close()
+        return [{"key": key, "tokens": tokens, "updated_ms": updated_ms} for key, tokens, updated_ms in rows]
+
+    def slot_acquire(self, name, capacity, ttl, owner):
+        now = _now_ms()
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front, so the count and the insert can't interleave.
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM storage_slots WHERE name = ? AND expires_ms < ?", (name, now))
+            in_use = conn.execute("SELECT COUNT(*) FROM storage_slots WHERE name = ?", (name,)).fetchone()[0]
+            if in_use >= capacity:
+                conn.rollback()
+                return None
+            cursor = conn.execute(
+                "INSERT INTO storage_slots (name, owner, acquired_ms, expires_ms) VALUES (?, ?, ?, ?)",
+                (name, owner, now, now + int(ttl * 1000))
+            )
+            conn.commit()
+            return str(cursor.lastrowid)
+        finally:
+            conn.close()
+
+    def slot_release(self, name, slot_id):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM storage_slots WHERE name = ? AND id = ?", (name, int(slot_id)))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def slot_list(self, name):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                """
+                SELECT id, owner, acquired_ms, expires_ms FROM storage_slots
+                WHERE name = ? AND expires_ms >= ? ORDER BY acquired_ms
+                """,
+                (name, _now_ms())
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"id": str(slot_id), "owner": owner, "acquired_ms": acquired_ms, "expires_ms": expires_ms}
+            for slot_id, owner, acquired_ms, expires_ms in rows
+        ]
+
+    # --- Pub/sub ---
+
+    def _send(self, channel, raw):
+        now = _now_ms()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO pubsub_messages (channel, payload, ts_ms) VALUES (?, ?, ?)",
+                (channel, raw, now)
+            )
+            # Prune now and then rather than on every publish.
+            if cursor.lastrowid % 100 == 0:
+                conn.execute("DELETE FROM pubsub_messages WHERE ts_ms < ?", (now - MESSAGE_RETENTION_MS,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _listen(self):
+        """Polls for messages newer than the last one handled (an index range scan on the primary key)."""
+        conn = self._connect()
+        try:
+            # Messages after our position may already have been pruned (e.g. a worker
+            # forked long after start-up): if so, reload everything instead.
+            oldest = conn.execute("SELECT MIN(id) FROM pubsub_messages").fetchone()[0]
+            if oldest is not None and oldest > self._position + 1:
+                self._resync()
+            while True:
+                rows = conn.execute(
+                    "SELECT id, channel, payload FROM pubsub_messages WHERE id > ? ORDER BY id",
+                    (self._position,)
+                ).fetchall()
+                for message_id, channel, payload in rows:
+                    self._position = message_id
+                    self._on_raw_message(channel, payload)
+                time.sleep(self.poll_interval)
+        finally:
+            conn.close()
@@ -0,0 +1,205 @@
+import json
+import math
+import time
+import uuid
+from .base import StorageBackend
+
+# Networked backend for running several hosts behind a load balancer. Any
+# Redis-protocol server works (Redis, Valkey, or a local stand-in such as
+# fakeredis's TCP server in tests). Requires the optional `redis` package.
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _prefix_pattern(prefix: str) -> str:
+    """A SCAN pattern matching keys that start with `prefix`, with glob characters escaped."""
+    return "".join("\\" + c if c in "*?[]\\" else c for c in prefix) + "*"
+
+
+class RedisBackend(StorageBackend):
+    name = "redis"
+    distributed = True
+
+    def __init__(self, url: str, prefix: str = "moodart:", logger=None):
+        super().__init__(logger=logger)
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("STORAGE_BACKEND=redis needs the redis package (pip install redis)") from e
+        self._redis = redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    # --- Key-value ---
+
+    def kv_get(self, key):
+        value = self.client.get(self._key("kv", key))
+        return value.decode("utf-8") if value is not None else None
+
+    def kv_set(self, key, value, ttl=None):
+        self.client.set(self._key("kv", key), value.encode("utf-8"), px=int(ttl * 1000) if ttl else None)
+
+    def kv_delete(self, key):
+        self.client.delete(self._key("kv", key))
+
+    def kv_scan(self, prefix):
+        base = self._key("kv", "")
+        keys = list(self.client.scan_iter(match=_prefix_pattern(base + prefix), count=500))
+        if not keys:
+            return {}
+        values = self.client.mget(keys)
+        return {
+            k.decode("utf-8")[len(base):]: v.decode("utf-8")
+            for k, v in zip(keys, values) if v is not None
+        }
+
+    # --- Blobs ---
+
+    def blob_get(self, bucket, name):
+        return self.client.get(self._key("blob", bucket, name))
+
+    def blob_put(self, bucket, name, data):
+        self.client.set(self._key("blob", bucket, name), data)
+
+    def blob_delete(self, bucket, name):
+        self.client.delete(self._key("blob", bucket, name))
+
+    # --- Locks ---
+
+    def _try_acquire(self, name, token, ttl):
+        return bool(self.client.set(self._key("lock", name), token, nx=True, px=int(ttl * 1000)))
+
+    def _release(self, name, token):
+        # Delete only if we still own it (the lease may have expired and been taken over).
+        key = self._key("lock", name)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) == token.encode("utf-8"):
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.execute()
+                else:
+                    pipe.unwatch()
+            except self._redis.WatchError:
+                pass
+
+    # --- Rate limits ---
+    # Read-modify-write under WATCH: if another client changes the key first,
+    # the transaction is discarded and retried on the new state.
+
+    def bucket_take(self, key, rate_per_minute, burst):
+        key = self._key("bucket", key)
+        rate_per_ms = rate_per_minute / 60000.0
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    now = _now_ms()
+                    stored_tokens, updated_ms = pipe.hmget(key, "tokens", "updated_ms")
+                    if stored_tokens is None:
+                        tokens = float(burst)
+                    else:
+                        tokens = min(burst, float(stored_tokens) + (now - int(updated_ms)) * rate_per_ms)
+                    if tokens < 1:
+                        pipe.unwatch()
+                        return False, tokens
+                    pipe.multi()
+                    pipe.hset(key, mapping={"tokens": tokens - 1, "updated_ms": now})
+                    if rate_per_ms > 0:
+                        # A bucket that has refilled completely is the same as no bucket.
+                        pipe.pexpire(key, math.ceil(burst / rate_per_ms))
+                    pipe.execute()
+                    return True, tokens
+                except self._redis.WatchError:
+                    continue
+
+    def bucket_levels(self):
+        base = self._key("bucket", "")
+        keys = list(self.client.scan_iter(match=_prefix_pattern(base), count=500))
+        with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hmget(key, "tokens", "updated_ms")
+            states = pipe.execute()
+        levels = [
+            {"key": key.decode("utf-8")[len(base):], "tokens": float(tokens), "updated_ms": int(updated_ms)}
+            for key, (tokens, updated_ms) in zip(keys, states) if tokens is not None
+        ]
+        return sorted(levels, key=lambda level: level["updated_ms"], reverse=True)
+
+    def slot_acquire(self, name, capacity, ttl, owner):
+        # Slot ids sit in a sorted set scored by expiry time; their details in a hash beside it.
+        key, info_key = self._key("slots", name), self._key("slots", name, "info")
+        ttl_ms = int(ttl * 1000)
+        slot_id = uuid.uuid4().hex
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    now = _now_ms()
+                    expired = pipe.zrangebyscore(key, "-inf", f"({now}")
+                    if pipe.zcard(key) - len(expired) >= capacity:
+                        pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    if expired:
+                        pipe.zrem(key, *expired)
+                        pipe.hdel(info_key, *expired)
+                    pipe.zadd(key, {slot_id: now + ttl_ms})
+                    pipe.hset(info_key, slot_id, json.dumps({"owner": owner, "acquired_ms": now}))
+                    # Once the newest slot has expired, nothing in either key is live.
+                    pipe.pexpire(key, ttl_ms)
+                    pipe.pexpire(info_key, ttl_ms)
+                    pipe.execute()
+                    return slot_id
+                except self._redis.WatchError:
+                    continue
+
+    def slot_release(self, name, slot_id):
+        with self.client.pipeline() as pipe:
+            pipe.zrem(self._key("slots", name), slot_id)
+            pipe.hdel(self._key("slots", name, "info"), slot_id)
+            pipe.execute()
+
+    def slot_list(self, name):
+        entries = self.client.zrangebyscore(self._key("slots", name), _now_ms(), "+inf", withscores=True)
+        if not entries:
+            return []
+        details = self.client.hmget(self._key("slots", name, "info"), [slot_id for slot_id, _ in entries])
+        slots = []
+        for (slot_id, expires_ms), detail in zip(entries, details):
+            detail = json.loads(detail) if detail else {}
+            slots.append({
+                "id": slot_id.decode("utf-8"),
+                "owner": detail.get("owner"),
+                "acquired_ms": detail.get("acquired_ms", 0),
+                "expires_ms": int(expires_ms),
+            })
+        return sorted(slots, key=lambda slot: slot["acquired_ms"])
+
+    # --- Pub/sub ---
+
+    def _send(self, channel, raw):
+        self.client.publish(self._key("channel", channel), raw)
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(*(self._key("channel", channel) for channel in self._handlers))
+            # Redis doesn't keep messages for absent subscribers, so anything published before
+            # now (e.g. between start-up and this worker's fork) is gone: reload instead.
+            self._resync()
+            base = self._key("channel", "")
+            for message in pubsub.listen():
+                if message["type"] == "message":
+                    self._on_raw_message(message["channel"].decode("utf-8")[len(base):], message["data"])
+        finally:
+            pubsub.close()
+
+    def close(self):
+        self.client.close()
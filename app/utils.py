@@ -1,5 +1,7 @@
 import os
 import sqlite3
+import time
+from datetime import datetime, timedelta
 from functools import wraps
 from flask import session, redirect, url_for, flash, current_app
 
@@ -22,6 +24,42 @@ def get_db():
     return conn
 
 
+def now_ms() -> int:
+    """Returns the current time as integer epoch milliseconds."""
+    return int(time.time() * 1000)
+
+
+def to_ms(value: datetime) -> int:
+    """Converts a datetime (naive values are treated as local time) to epoch milliseconds."""
+    return int(value.timestamp() * 1000)
+
+
+def from_ms(value: int | None) -> datetime | None:
+    """Converts epoch milliseconds to a local naive datetime."""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value / 1000)
+
+
+def parse_filter_ms(value: str, end_of_day: bool = False) -> int | None:
+    """
+    Parses a date or datetime filter string (e.g. '2025-09-05' or
+    '2025-09-05T14:30') into epoch milliseconds. A bare date used as an upper
+    bound covers the whole day. Returns None if the value cannot be parsed.
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+        return to_ms(parsed) - 1
+    return to_ms(parsed)
+
+
 def login_required(view):
     """Decorator to ensure a user is logged in before accessing a view."""
     @wraps(view)
@@ -0,0 +1,70 @@
+import os
+import time
+from jinja2 import FileSystemBytecodeCache
+
+from . import http_cache, settings
+from .models.user import refresh_users_cache
+from .utils import get_db
+
+# Start-up warm-up, so the first requests a new worker serves are not the
+# ones that compile templates, read users.json and open the database.
+#
+# Run under `gunicorn --preload` (see gunicorn.conf.py), the warm-up happens
+# once in the master process and every forked worker inherits the compiled
+# templates and caches copy-on-write. Without --preload each worker warms up
+# on its own, but templates still load from the on-disk bytecode cache.
+#
+# The warm-up runs inside create_app(), so a process never serves requests
+# before it has finished.
+
+
+def init_bytecode_cache(app) -> None:
+    """Persists compiled Jinja templates under the instance folder, shared by all workers and restarts."""
+    cache_dir = os.path.join(app.instance_path, "jinja_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+
+def _compile_templates(app) -> int:
+    names = app.jinja_env.list_templates(extensions=["html"])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def _hash_static_files(app) -> int:
+    count = 0
+    for root, _, files in os.walk(app.static_folder):
+        for filename in files:
+            relative = os.path.relpath(os.path.join(root, filename), app.static_folder)
+            http_cache.static_version(app.static_folder, relative.replace(os.sep, "/"))
+            count += 1
+    return count
+
+
+def _prime_database() -> None:
+    """Touches the tables and indexes the first pages read, pulling them into the page cache."""
+    db = get_db()
+    try:
+        for table in ("logs", "feedback", "presence", "settings"):
+            db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        db.execute("SELECT MAX(ts_ms) FROM logs").fetchone()
+    finally:
+        db.close()
+
+
+def warm_up(app) -> None:
+    """Precompiles templates, fills the user, settings and static-hash caches and primes the DB."""
+    started = time.monotonic()
+    with app.app_context():
+        templates = _compile_templates(app)
+        refresh_users_cache()
+        settings.load_settings()
+        _prime_database()
+        static_files = _hash_static_files(app)
+
+    elapsed = time.monotonic() - started
+    app.extensions["warmup"] = {"seconds": round(elapsed, 3)}
+    app.logger.info(
+        f"Warm-up done in {elapsed:.2f}s ({templates} templates, {static_files} static files)"
+    )
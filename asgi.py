@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Ensure the 'app' module can be found by adding the project root to the system path.
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app.asgi import create_asgi_app
+
+# Async serving mode: uvicorn asgi:app
+app = create_asgi_app()
@@ -0,0 +1,203 @@
+"""
+Compares /generate throughput in the sync (gunicorn) and async (uvicorn)
+serving modes against a local stub of the image service.
+
+    python bench_generate.py --requests 400 --concurrency 200 --delay 1.0
+
+The stub answers image requests after `--delay` seconds (or `--slow-delay`
+for a `--slow-fraction` of them), so the numbers show how many generations
+each mode can keep in flight at once. /generate runs through the hedged
+provider router as in production (`--providers`, default: the app's
+IMAGE_PROVIDERS), so slow stub replies are hedged to the procedural
+renderer; the `hedged` column counts responses not served by the stub.
+Requires requirements-async.txt, plus gunicorn (sync mode).
+"""
+import argparse
+import asyncio
+import base64
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+from flask import Flask
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+SECRET_KEY = "bench-secret"
+
+# A 1x1 transparent PNG, standing in for a generated image.
+PNG_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000100e5270de40000000049454e44ae426082"
+)
+STUB_IMAGE_MARKER = base64.b64encode(PNG_BYTES).decode("ascii")
+
+
+async def start_stub(port: int, delay: float, slow_fraction: float = 0.0, slow_delay: float = 0.0) -> web.AppRunner:
+    """Starts a fake ClipDrop endpoint that replies after `delay` seconds (`slow_delay` for a `slow_fraction` of requests)."""
+    async def text_to_image(request):
+        await request.read()
+        await asyncio.sleep(slow_delay if random.random() < slow_fraction else delay)
+        return web.Response(body=PNG_BYTES, content_type="image/png")
+
+    stub = web.Application()
+    stub.router.add_post("/text-to-image/v1", text_to_image)
+    runner = web.AppRunner(stub, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def session_cookie(username: str) -> str:
+    """Signs a Flask session cookie for `username` with the benchmark secret key."""
+    signer_app = Flask(__name__)
+    signer_app.secret_key = SECRET_KEY
+    return signer_app.session_interface.get_signing_serializer(signer_app).dumps({"username": username})
+
+
+def start_server(mode: str, port: int, args, stub_port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SECRET_KEY=SECRET_KEY,
+        DEBUG="false",
+        DB_FILE=f"bench_{mode}.db",
+        CLIPDROP_API_KEY="bench",
+        CLIPDROP_API_URL=f"http://127.0.0.1:{stub_port}/text-to-image/v1",
+        # Measure the serving mode, not the quotas.
+        GENERATE_RATE_PER_MINUTE="1000000",
+        GENERATE_BURST="1000000",
+        UPSTREAM_MAX_INFLIGHT=str(args.concurrency * 2),
+        ASYNC_UPSTREAM_POOL_SIZE=str(args.concurrency),
+    )
+    if args.providers:
+        env["IMAGE_PROVIDERS"] = args.providers
+    if mode == "sync":
+        command = [
+            sys.executable, "-m", "gunicorn", "run:app", "--bind", f"127.0.0.1:{port}",
+            "-k", "gthread", "--workers", str(args.workers), "--threads", str(args.threads),
+            "--timeout", "120", "--log-level", "warning",
+        ]
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--no-access-log",
+        ]
+    return subprocess.Popen(command, cwd=PROJECT_ROOT, env=env)
+
+
+async def wait_until_up(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as client:
+        while time.monotonic() < deadline:
+            try:
+                async with client.get(f"{base_url}/static/css/styles.css"):
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start")
+
+
+async def run_load(base_url: str, total: int, concurrency: int) -> tuple[list[float], int, int, float]:
+    """
+    Fires `total` generate requests, `concurrency` at a time.
+    Returns (latencies, errors, hedged, wall time); `hedged` counts images not served by the stub.
+    """
+    cookie = session_cookie("bench")
+    latencies: list[float] = []
+    errors = 0
+    hedged = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker(client):
+        nonlocal errors, hedged
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                async with client.post(
+                    f"{base_url}/generate",
+                    data={"emotion": "happiness", "prompt": "benchmark"},
+                    headers={"Cookie": f"session={cookie}"},
+                ) as response:
+                    body = await response.text()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+                    if STUB_IMAGE_MARKER not in body:
+                        hedged += 1
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return latencies, errors, hedged, wall
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="sync,async", help="comma-separated: sync, async")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=1.0, help="stub upstream latency in seconds")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="share of stub replies that take --slow-delay")
+    parser.add_argument("--slow-delay", type=float, default=15.0, help="latency of the slow stub replies in seconds")
+    parser.add_argument("--providers", default="", help="IMAGE_PROVIDERS for the server (default: the app's)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers (sync mode)")
+    parser.add_argument("--threads", type=int, default=8, help="threads per gunicorn worker (sync mode)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    stub_port = args.port + 1
+    stub = await start_stub(stub_port, args.delay, args.slow_fraction, args.slow_delay)
+    results = []
+    try:
+        for mode in args.modes.split(","):
+            server = start_server(mode, args.port, args, stub_port)
+            base_url = f"http://127.0.0.1:{args.port}"
+            try:
+                await wait_until_up(base_url)
+                latencies, errors, hedged, wall = await run_load(base_url, args.requests, args.concurrency)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+                db_path = os.path.join(PROJECT_ROOT, "data", f"bench_{mode}.db")
+                for suffix in ("", "-wal", "-shm", "-journal"):
+                    if os.path.exists(db_path + suffix):
+                        os.remove(db_path + suffix)
+            results.append((mode, latencies, errors, hedged, wall))
+    finally:
+        await stub.cleanup()
+
+    print(f"\n{args.requests} requests, concurrency {args.concurrency}, upstream delay {args.delay}s"
+          + (f" ({args.slow_fraction:.0%} at {args.slow_delay}s)" if args.slow_fraction else ""))
+    print(f"{'mode':<6} {'req/s':>8} {'p50 s':>8} {'p95 s':>8} {'max s':>8} {'mean s':>8} {'errors':>7} {'hedged':>7}")
+    for mode, latencies, errors, hedged, wall in results:
+        ok = len(latencies)
+        print(
+            f"{mode:<6} {ok / wall:>8.1f} {percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f} "
+            f"{max(latencies, default=float('nan')):>8.2f} "
+            f"{statistics.mean(latencies) if latencies else float('nan'):>8.2f} {errors:>7} {hedged:>7}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
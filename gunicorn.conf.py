@@ -0,0 +1,20 @@
+# Gunicorn settings, picked up automatically by `gunicorn run:app`.
+import gc
+import os
+
+# Load (and warm up) the app once in the master process; workers are forked
+# from it and share the compiled templates and caches copy-on-write.
+preload_app = True
+
+# Threaded workers, so /admin/stream connections don't each hold a process.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def when_ready(server):
+    # Move everything allocated during import and warm-up into the permanent
+    # generation. Otherwise the garbage collector in each worker writes to
+    # those objects' headers and un-shares the memory pages they live on.
+    gc.freeze()
@@ -6,7 +6,11 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 from app import create_app
 
-app = create_app()
+# Processes started with the "spawn" method (the password-hashing pool)
+# re-import this file as __mp_main__. They only hash passwords: creating an
+# app there would rerun the migrations, storage set-up and warm-up in each one.
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=app.config.get("DEBUG", True))
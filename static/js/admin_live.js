@@ -0,0 +1,49 @@
+// Live updates for the admin pages.
+// Connects to the server-sent event stream and hands each event to the page's handlers.
+(function () {
+  function pad(n) {
+    return String(n).padStart(2, '0');
+  }
+
+  window.AdminLive = {
+    // handlers: { log: fn(payload), feedback: fn(payload), stats: fn(payload), presence: fn(payload) }
+    connect(url, handlers) {
+      if (!window.EventSource) return null;
+
+      const source = new EventSource(url);
+      for (const [type, handler] of Object.entries(handlers)) {
+        source.addEventListener(type, (evt) => handler(JSON.parse(evt.data)));
+      }
+      // The server dropped our backlog because we fell behind: reload once to catch up.
+      source.addEventListener('resync', () => window.location.reload());
+      return source;
+    },
+
+    // Formats epoch milliseconds as dd/mm/yyyy HH:MM (matching the server-rendered tables).
+    formatDate(ms) {
+      const d = new Date(ms);
+      return `${pad(d.getDate())}/${pad(d.getMonth() + 1)}/${d.getFullYear()} ${pad(d.getHours())}:${pad(d.getMinutes())}`;
+    },
+
+    truncate(text, length) {
+      text = text || '';
+      return text.length > length ? text.slice(0, length - 3) + '...' : text;
+    },
+
+    // Builds a table cell whose content is set as text (never as HTML).
+    cell(text, className) {
+      const td = document.createElement('td');
+      if (className) td.className = className;
+      td.textContent = text;
+      return td;
+    },
+
+    // Adds a row to the top of a table body, keeping at most `limit` rows.
+    prependRow(tbody, row, limit) {
+      tbody.insertBefore(row, tbody.firstChild);
+      if (limit) {
+        while (tbody.rows.length > limit) tbody.deleteRow(tbody.rows.length - 1);
+      }
+    }
+  };
+})();
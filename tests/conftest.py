@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Make the 'app' package importable when pytest is run from anywhere.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on a fresh database in a temporary directory, without the start-up warm-up."""
+    monkeypatch.setenv("DB_FILE", str(tmp_path / "app.db"))
+    monkeypatch.setenv("SNAPSHOT_DIR", str(tmp_path / "snapshot"))
+    monkeypatch.setenv("WARMUP", "false")
+    from app import create_app
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        yield app
+    app.extensions["storage"].close()
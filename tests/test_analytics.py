@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+from app import analytics
+from app.analytics import DAY, HOUR
+from app.utils import get_db
+
+
+def utc_ms(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def add_logs(*entries):
+    db = get_db()
+    db.executemany("INSERT INTO logs (event, user, ts_ms) VALUES (?, ?, ?)", entries)
+    db.commit()
+    db.close()
+
+
+def test_days_start_at_the_clients_midnight(app):
+    # 23:30 and 00:30 local time at UTC+2, on either side of local midnight.
+    add_logs(("login_success", "alice", utc_ms(2025, 9, 5, 21, 30)), ("login_success", "bob", utc_ms(2025, 9, 5, 22, 30)))
+    start, end = utc_ms(2025, 9, 5, 12), utc_ms(2025, 9, 6, 12)
+
+    local = analytics.bucket_counts(start, end, granularity="day", tz_offset_minutes=120)
+    assert local["buckets"][0] == utc_ms(2025, 9, 4, 22)
+    assert local["series"] == [{"key": "login_success", "counts": [1, 1], "total": 2}]
+
+    utc = analytics.bucket_counts(start, end, granularity="day", tz_offset_minutes=0)
+    assert utc["buckets"][0] == utc_ms(2025, 9, 5)
+    assert utc["series"][0]["counts"][0] == 2
+
+
+def test_long_ranges_are_downsampled_to_clock_aligned_buckets(app):
+    start = utc_ms(2025, 9, 1, 9)
+    add_logs(*[("generate", "alice", start + hours * HOUR) for hours in range(0, 7 * 24, 5)])
+
+    counts = analytics.bucket_counts(start, start + 7 * DAY, granularity="hour", points=24, tz_offset_minutes=-300)
+    # 168 hours in at most 24 points: 7 hours is not a clock-friendly width, 12 hours is.
+    assert counts["bucket_ms"] == 12 * HOUR
+    assert counts["downsampled"]
+    assert len(counts["buckets"]) <= 24 + 1
+    # Buckets start at local (UTC-5) midnight or noon.
+    assert all((bucket - 5 * HOUR) % (12 * HOUR) == 0 for bucket in counts["buckets"])
+    assert counts["buckets"][0] <= start < counts["buckets"][1]
+    # Merging buckets doesn't lose events.
+    assert counts["total"] == sum(counts["series"][0]["counts"]) == len(range(0, 7 * 24, 5))
+
+
+def test_range_beyond_the_widest_step_uses_whole_months(app):
+    assert analytics._bucket_step(400 * DAY, "day", 4) == 120 * DAY
+    assert analytics._bucket_step(2 * HOUR, "minute", 200) == analytics.MINUTE
+
+
+def test_quiet_groups_are_merged_into_other(app):
+    ts = utc_ms(2025, 9, 5, 12)
+    add_logs(*[("login_success", "alice", ts)] * 3, *[("generate", "bob", ts)] * 2, ("logout", "carol", ts))
+    counts = analytics.bucket_counts(ts, ts, granularity="day", top=1, tz_offset_minutes=0)
+    assert [(s["key"], s["total"]) for s in counts["series"]] == [("login_success", 3), (analytics.OTHER_GROUP, 3)]
+    assert counts["totals"] == {"login_success": 3, "generate": 2, "logout": 1}
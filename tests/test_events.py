@@ -0,0 +1,48 @@
+from app import events
+from app.logger import log_event
+from app.utils import get_db
+
+
+def relayed_count():
+    db = get_db()
+    count = db.execute("SELECT COUNT(*) FROM pubsub_messages WHERE channel = 'events'").fetchone()[0]
+    db.close()
+    return count
+
+
+def test_events_stay_in_process_without_listeners(app):
+    subscription = events.broadcaster.subscribe()
+    try:
+        log_event("login_success", user="alice")
+        assert relayed_count() == 0
+        event_type, payload = subscription.get_nowait()
+        assert (event_type, payload["user"]) == ("log", "alice")
+    finally:
+        events.broadcaster.unsubscribe(subscription)
+
+
+def test_events_are_relayed_while_a_stream_is_listening(app):
+    subscription = events.broadcaster.subscribe()
+    try:
+        events.mark_listening(keepalive=15)
+        log_event("login_success", user="alice")
+        assert relayed_count() == 1
+        assert subscription.get_nowait()[0] == "log"
+        assert subscription.empty()
+    finally:
+        events.broadcaster.unsubscribe(subscription)
+
+
+def test_admin_stream_marks_listening(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "admin"
+    response = client.get("/admin/stream")
+    stream = response.response
+    next(stream)  # retry hint
+    next(stream)  # presence
+    # Opening the stream marked it; the next event is relayed to every process.
+    assert app.extensions["storage"].kv_get(events.LISTENING_KEY) == "1"
+    log_event("login_success", user="alice")
+    assert relayed_count() == 1
+    response.close()
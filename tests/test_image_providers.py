@@ -0,0 +1,81 @@
+import threading
+import time
+
+from app import ratelimit
+from app.image_providers import HedgedRouter, ImageProvider
+
+
+class GatedProvider(ImageProvider):
+    """An upstream call that doesn't answer until the test opens the gate."""
+    name = "gated"
+    cacheable = False
+
+    def __init__(self):
+        self.gate = threading.Event()
+
+    def generate(self, prompt, emotion):
+        self.gate.wait(5)
+        return "data:image/png;base64,Z2F0ZWQ="
+
+
+class InlineProvider(ImageProvider):
+    name = "inline"
+    cacheable = False
+    local = True
+
+    def __init__(self):
+        self.threads = []
+
+    def generate(self, prompt, emotion):
+        self.threads.append(threading.get_ident())
+        return "data:image/png;base64,aW5saW5l"
+
+
+def make_router(*providers):
+    return HedgedRouter(list(providers), min_delay=0.01, max_delay=0.05, default_delay=0.05, deadline=5)
+
+
+def wait_for(predicate, timeout=5.0):
+    give_up_at = time.monotonic() + timeout
+    while time.monotonic() < give_up_at:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_slot_is_held_until_the_losing_call_finishes(app):
+    gated, inline = GatedProvider(), InlineProvider()
+    lease = ratelimit.acquire_slot(capacity=1, lease_seconds=60)
+    settled = []
+
+    def release():
+        settled.append(threading.get_ident())
+        ratelimit.release_slot(lease)
+
+    result = make_router(gated, inline).generate("storm", "fear", on_settled=release)
+    # The hedge won, on the request's own thread; the upstream call is still running.
+    assert result.endswith("aW5saW5l")
+    assert inline.threads == [threading.get_ident()]
+    assert settled == []
+    assert ratelimit.acquire_slot(capacity=1, lease_seconds=60) is None
+
+    gated.gate.set()
+    assert wait_for(lambda: settled)
+    time.sleep(0.05)
+    assert len(settled) == 1
+    assert ratelimit.acquire_slot(capacity=1, lease_seconds=60) is not None
+
+
+def test_settles_at_once_when_nothing_is_left_running(app):
+    gated = GatedProvider()
+    gated.gate.set()
+    settled = []
+    result = make_router(gated).generate("storm", "fear", on_settled=lambda: settled.append(True))
+    assert result.endswith("Z2F0ZWQ=")
+    assert wait_for(lambda: settled)
+    assert settled == [True]
+
+    settled.clear()
+    make_router(InlineProvider()).generate("storm", "fear", on_settled=lambda: settled.append(True))
+    assert settled == [True]
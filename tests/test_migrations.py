@@ -0,0 +1,41 @@
+import sqlite3
+
+import pytest
+
+from app.migrations import MigrationError, migrate, migrate_data
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO logs (event, user, ts_ms) VALUES ('login_success', ?, ?)",
+        [("Alice", 1), ("alice ", 2), ("bob", 3)],
+    )
+    conn.executemany(
+        "INSERT INTO presence (username, last_seen_ms, last_login_ms) VALUES (?, ?, ?)",
+        [("Alice", 5, None), ("alice", 3, 2), ("ALICE", 9, 1)],
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_usernames_are_lower_cased_once(conn):
+    migrate_data(conn, ["Alice", "bob"])
+    assert [row[0] for row in conn.execute("SELECT user FROM logs ORDER BY id")] == ["alice", "alice", "bob"]
+    assert conn.execute("SELECT * FROM presence").fetchall() == [("alice", 9, 2)]
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+
+    # Already applied: later mixed-case rows are left alone.
+    conn.execute("INSERT INTO logs (event, user, ts_ms) VALUES ('x', 'Carol', 4)")
+    migrate_data(conn, ["Alice", "bob"])
+    assert conn.execute("SELECT user FROM logs WHERE id = 4").fetchone()[0] == "Carol"
+
+
+def test_case_collision_in_users_file_stops_the_migration(conn):
+    with pytest.raises(MigrationError, match="Alice / alice"):
+        migrate_data(conn, ["Alice", "alice", "bob"])
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    assert conn.execute("SELECT user FROM logs WHERE id = 1").fetchone()[0] == "Alice"
@@ -0,0 +1,74 @@
+import pytest
+
+from app import ratelimit
+from app.storage import local
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Pins the clock of the local backend and the usage page; advance it with clock["ms"] += ..."""
+    clock = {"ms": 1_757_000_000_000}
+    monkeypatch.setattr(local, "_now_ms", lambda: clock["ms"])
+    monkeypatch.setattr(ratelimit, "now_ms", lambda: clock["ms"])
+    return clock
+
+
+def test_bucket_allows_the_burst_then_refills(app, clock):
+    assert ratelimit.take_token("generate:alice", 4, 2) == (True, 0)
+    assert ratelimit.take_token("generate:alice", 4, 2) == (True, 0)
+    assert ratelimit.take_token("generate:alice", 4, 2) == (False, 15)
+    # A rejected request doesn't spend anything: after 15s one token is back.
+    clock["ms"] += 15_000
+    assert ratelimit.take_token("generate:alice", 4, 2) == (True, 0)
+    # Refilling stops at the burst size.
+    clock["ms"] += 10 * 60_000
+    assert [ratelimit.take_token("generate:alice", 4, 2)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_retry_after_counts_down_to_the_next_token(app, clock):
+    ratelimit.take_token("generate:alice", 4, 1)
+    clock["ms"] += 7_500
+    assert ratelimit.take_token("generate:alice", 4, 1) == (False, 8)
+    clock["ms"] += 7_000
+    assert ratelimit.take_token("generate:alice", 4, 1) == (False, 1)
+    assert ratelimit.take_token("generate:bob", 4, 1) == (True, 0)
+
+
+def test_disabled_refill_asks_for_a_minute(app, clock):
+    assert ratelimit.take_token("generate:alice", 0, 1) == (True, 0)
+    assert ratelimit.take_token("generate:alice", 0, 1) == (False, 60)
+
+
+def test_generate_answers_429_with_retry_after(app, clock):
+    ratelimit.take_token("generate:alice", app.config["GENERATE_RATE_PER_MINUTE"], 1)
+    app.config["GENERATE_BURST"] = 1
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "Alice"
+    response = client.post("/generate", data={"emotion": "fear", "prompt": "storm"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) == 60 / app.config["GENERATE_RATE_PER_MINUTE"]
+
+
+def test_expired_lease_frees_its_slot(app, clock):
+    lease = ratelimit.acquire_slot(capacity=1, lease_seconds=60)
+    assert lease is not None
+    assert ratelimit.acquire_slot(capacity=1, lease_seconds=60) is None
+    clock["ms"] += 61_000
+    replacement = ratelimit.acquire_slot(capacity=1, lease_seconds=60)
+    assert replacement is not None
+    # Releasing the expired lease late doesn't free the slot its replacement holds.
+    ratelimit.release_slot(lease)
+    assert ratelimit.acquire_slot(capacity=1, lease_seconds=60) is None
+    ratelimit.release_slot(replacement)
+    assert ratelimit.acquire_slot(capacity=1, lease_seconds=60) is not None
+
+
+def test_usage_snapshot_shows_refilled_levels(app, clock):
+    ratelimit.take_token("generate:alice", 4, 2)
+    ratelimit.take_token("generate:alice", 4, 2)
+    clock["ms"] += 7_500
+    lease = ratelimit.acquire_slot(capacity=2, lease_seconds=60)
+    usage = ratelimit.usage_snapshot(4, 2)
+    assert [(b["key"], b["tokens"], b["used"]) for b in usage["buckets"]] == [("generate:alice", 0.5, 1.5)]
+    assert [l["id"] for l in usage["leases"]] == [lease]
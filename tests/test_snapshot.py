@@ -0,0 +1,93 @@
+import json
+import os
+
+from app import snapshot
+from app.models.user import purge_user_rows
+from app.utils import get_db
+
+
+def add_feedback(username, emotion="fear", ts_ms=1_757_000_000_000):
+    db = get_db()
+    db.execute(
+        "INSERT INTO feedback (username, emotion, predicted_correct, advice_ok, ts_ms) VALUES (?, ?, 1, 1, ?)",
+        (username, emotion, ts_ms)
+    )
+    db.commit()
+    db.close()
+
+
+def read_meta(app):
+    with open(os.path.join(app.config["SNAPSHOT_DIR"], "meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_refresh_appends_new_rows(app):
+    add_feedback("alice")
+    first = snapshot.refresh()
+    add_feedback("bob", emotion="anger")
+    second = snapshot.refresh()
+    assert second["generation"] == first["generation"] + 1
+    assert second["build"] == first["build"]
+    assert second["rows"]["feedback"] == 2
+    assert second["dictionaries"]["users"] == ["alice", "bob"]
+
+
+def test_idle_refresh_keeps_the_generation(app):
+    add_feedback("alice")
+    first = snapshot.refresh()
+    written = os.path.getmtime(os.path.join(app.config["SNAPSHOT_DIR"], "meta.json"))
+    again = snapshot.refresh()
+    assert again["generation"] == first["generation"]
+    assert read_meta(app)["generation"] == first["generation"]
+    assert os.path.getmtime(os.path.join(app.config["SNAPSHOT_DIR"], "meta.json")) == written
+
+
+def test_purge_removes_the_name_from_the_snapshot(app):
+    add_feedback("alice")
+    add_feedback("bob")
+    snapshot.refresh()
+    db = get_db()
+    purge_user_rows(["alice"], db)
+    db.close()
+
+    meta = snapshot.refresh()
+    assert meta["dictionaries"]["users"] == ["bob"]
+    assert read_meta(app)["dictionaries"]["users"] == ["bob"]
+    assert meta["rows"]["feedback"] == 1
+    # Only the new build's column files are left.
+    assert [name for name in os.listdir(app.config["SNAPSHOT_DIR"]) if name.startswith("columns-")] == [
+        f"columns-{meta['build']}"
+    ]
+
+
+def test_purging_the_newest_rows_is_not_a_replaced_database(app):
+    add_feedback("alice")
+    add_feedback("bob")
+    first = snapshot.refresh()
+    db = get_db()
+    purge_user_rows(["bob"], db)
+    meta = snapshot.refresh()
+    # The purge rebuilt the snapshot once; after that, deleting the newest
+    # rows outright (so MAX(id) falls behind the cursor) must not.
+    db.execute("DELETE FROM feedback")
+    db.commit()
+    db.close()
+    again = snapshot.refresh()
+    assert again["build"] == meta["build"] > first["build"]
+    assert again["generation"] == meta["generation"]
+
+
+def test_replaced_database_is_rebuilt(app):
+    add_feedback("alice")
+    add_feedback("bob")
+    first = snapshot.refresh()
+    db = get_db()
+    db.execute("DELETE FROM feedback")
+    db.execute("DELETE FROM sqlite_sequence WHERE name = 'feedback'")
+    db.commit()
+    db.close()
+    add_feedback("carol")
+
+    meta = snapshot.refresh()
+    assert meta["build"] > first["build"]
+    assert meta["dictionaries"]["users"] == ["carol"]
@@ -0,0 +1,198 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.migrations import migrate
+from app.storage import IMAGES, LocalBackend, LockTimeout
+
+# Every test runs against both backends. Two backend objects on the same store
+# stand in for two worker processes.
+
+
+def wait_for(predicate, timeout=5.0):
+    give_up_at = time.monotonic() + timeout
+    while time.monotonic() < give_up_at:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("redis")
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    yield f"redis://{host}:{port}/0"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["local", "redis"])
+def make_backend(request, tmp_path):
+    """Returns a factory for backends that all share one store."""
+    created = []
+    if request.param == "local":
+        db_path = str(tmp_path / "storage.db")
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+        conn.close()
+
+        def make():
+            backend = LocalBackend(db_path, blob_dirs={IMAGES: str(tmp_path / "images")}, poll_interval=0.05)
+            created.append(backend)
+            return backend
+    else:
+        from app.storage.redis_backend import RedisBackend
+        url = request.getfixturevalue("redis_url")
+        prefix = f"test-{request.node.name}:"
+
+        def make():
+            backend = RedisBackend(url, prefix=prefix)
+            created.append(backend)
+            return backend
+
+    yield make
+    for backend in created:
+        backend.close()
+
+
+def test_kv_roundtrip(make_backend):
+    storage = make_backend()
+    assert storage.kv_get("setting:theme") is None
+    storage.kv_set("setting:theme", "dark")
+    assert storage.kv_get("setting:theme") == "dark"
+    storage.kv_set("setting:theme", "light")
+    assert make_backend().kv_get("setting:theme") == "light"
+    storage.kv_delete("setting:theme")
+    assert storage.kv_get("setting:theme") is None
+
+
+def test_kv_expires(make_backend):
+    storage = make_backend()
+    storage.kv_set("short", "1", ttl=0.1)
+    storage.kv_set("long", "2")
+    assert storage.kv_get("short") == "1"
+    time.sleep(0.2)
+    assert storage.kv_get("short") is None
+    assert storage.kv_get("long") == "2"
+
+
+def test_kv_scan_matches_prefix_literally(make_backend):
+    storage = make_backend()
+    storage.kv_set("setting:a", "1")
+    storage.kv_set("setting:b", "2")
+    storage.kv_set("settings_other", "3")
+    storage.kv_set("odd%*_[key]", "4")
+    assert storage.kv_scan("setting:") == {"setting:a": "1", "setting:b": "2"}
+    assert storage.kv_scan("odd%*_[") == {"odd%*_[key]": "4"}
+    assert storage.kv_scan("odd_") == {}
+
+
+def test_blob_roundtrip(make_backend):
+    storage = make_backend()
+    assert storage.blob_get(IMAGES, "a.png") is None
+    storage.blob_put(IMAGES, "a.png", b"\x89PNG")
+    assert make_backend().blob_get(IMAGES, "a.png") == b"\x89PNG"
+    storage.blob_delete(IMAGES, "a.png")
+    assert storage.blob_get(IMAGES, "a.png") is None
+
+
+def test_lock_is_exclusive(make_backend):
+    first, second = make_backend(), make_backend()
+    with first.lock("users-file"):
+        with pytest.raises(LockTimeout):
+            with second.lock("users-file", timeout=0.1):
+                pass
+        # Other names are independent.
+        with second.lock("settings", timeout=0.1):
+            pass
+    with second.lock("users-file", timeout=0.1):
+        pass
+
+
+def test_expired_lock_can_be_taken_over(make_backend):
+    first, second = make_backend(), make_backend()
+    with first.lock("analytics-snapshot", ttl=0.1):
+        time.sleep(0.2)
+        with second.lock("analytics-snapshot", timeout=0.5):
+            pass
+
+
+def test_pubsub_reaches_other_process(make_backend):
+    sender, receiver = make_backend(), make_backend()
+    received = []
+    receiver.subscribe("users", received.append)
+    receiver.ensure_listener()
+    # Redis drops messages sent before the listener subscribed; it resyncs once it has.
+    if receiver.distributed:
+        assert wait_for(lambda: {"resync": True} in received)
+
+    sender.publish("users", {"changed": "alice"})
+    assert wait_for(lambda: {"changed": "alice"} in received)
+
+
+def test_pubsub_delivers_own_messages_once(make_backend):
+    storage, other = make_backend(), make_backend()
+    own, seen_by_other = [], []
+    storage.subscribe("settings", own.append)
+    other.subscribe("settings", seen_by_other.append)
+    storage.ensure_listener()
+    other.ensure_listener()
+    if storage.distributed:
+        assert wait_for(lambda: {"resync": True} in own and {"resync": True} in seen_by_other)
+        own.clear()
+
+    storage.publish("settings", {"n": 1})
+    assert own == [{"n": 1}]
+    assert wait_for(lambda: {"n": 1} in seen_by_other)
+    # The store echoes the message back to its sender, which must skip it.
+    time.sleep(0.2)
+    assert own == [{"n": 1}]
+
+
+def test_forked_child_gets_its_own_origin(make_backend):
+    storage = make_backend()
+    parent_origin = storage.origin
+    storage._after_fork()
+    assert storage.origin != parent_origin
+
+
+def test_bucket_take_is_shared(make_backend):
+    first, second = make_backend(), make_backend()
+    assert first.bucket_take("generate:alice", 0.6, 2) == (True, 2)
+    allowed, tokens = second.bucket_take("generate:alice", 0.6, 2)
+    assert allowed and 1 <= tokens < 1.01
+    allowed, tokens = first.bucket_take("generate:alice", 0.6, 2)
+    assert not allowed and tokens < 0.01
+    # Other keys have their own bucket.
+    assert second.bucket_take("generate:bob", 0.6, 2)[0]
+    assert sorted(level["key"] for level in first.bucket_levels()) == ["generate:alice", "generate:bob"]
+
+
+def test_slots_are_counted_across_processes(make_backend):
+    first, second = make_backend(), make_backend()
+    held = first.slot_acquire("upstream", 2, 30, owner="host-a:1")
+    assert second.slot_acquire("upstream", 2, 30, owner="host-b:2") is not None
+    assert first.slot_acquire("upstream", 2, 30, owner="host-a:1") is None
+    # Other names are independent.
+    assert first.slot_acquire("other", 1, 30, owner="host-a:1") is not None
+    assert sorted(slot["owner"] for slot in second.slot_list("upstream")) == ["host-a:1", "host-b:2"]
+
+    second.slot_release("upstream", held)
+    assert [slot["owner"] for slot in first.slot_list("upstream")] == ["host-b:2"]
+    assert first.slot_acquire("upstream", 2, 30, owner="host-a:1") is not None
+
+
+def test_expired_slot_is_freed(make_backend):
+    first, second = make_backend(), make_backend()
+    assert first.slot_acquire("upstream", 1, 0.1, owner="crashed") is not None
+    assert second.slot_acquire("upstream", 1, 30, owner="b") is None
+    time.sleep(0.2)
+    assert first.slot_list("upstream") == []
+    assert second.slot_acquire("upstream", 1, 30, owner="b") is not None